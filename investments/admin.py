@@ -1,10 +1,13 @@
 from django.contrib import admin
 
-from .models import Option, Ticker, Transaction, Share, Security, Cash, PortfolioTracker
+from .models import Option, Ticker, Transaction, Share, Security, Cash, PortfolioTracker, QuoteSnapshot, PortfolioHistoryPoint, PortfolioRollup
 
 admin.site.register(Option)
 admin.site.register(Ticker)
 admin.site.register(Transaction)
 admin.site.register(Share)
 admin.site.register(Cash)
-admin.site.register(PortfolioTracker)
\ No newline at end of file
+admin.site.register(PortfolioTracker)
+admin.site.register(QuoteSnapshot)
+admin.site.register(PortfolioHistoryPoint)
+admin.site.register(PortfolioRollup)
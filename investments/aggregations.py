@@ -0,0 +1,47 @@
+from django.db.models import F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from investments.models import Option, Share, Cash
+
+import collections
+
+# ----------------------------------------------------------------------- #
+#                             Closed Positions
+# ----------------------------------------------------------------------- #
+# Closed positions never need a live quote, so their P&L and value are summed in the database and
+#  only open positions are loaded into Python. The expressions mirror calculate_pl() on the models
+
+def get_closed_position_totals():
+    option_pl = F('live_pl') * 100 + Coalesce(F('current_value'), Value(0.0))
+    share_pl = F('live_pl') + Coalesce(F('current_value'), Value(0.0))
+
+    gains_by_ticker = collections.defaultdict(float)
+    current_value = 0
+    for model, pl in ((Option, option_pl), (Share, share_pl)):
+        rows = (
+            model.objects.filter(num_open=0)
+            .values('ticker__nasdaq_name')
+            .annotate(
+                gain=Sum(pl, output_field=FloatField()),
+                value=Sum(Coalesce(F('current_value'), Value(0.0)), output_field=FloatField()),
+            )
+            .order_by('ticker__nasdaq_name')
+        )
+        for row in rows:
+            gains_by_ticker[row['ticker__nasdaq_name']] += row['gain']
+            current_value += row['value']
+
+    return {
+        'gains_by_ticker': dict(gains_by_ticker),
+        'current_value': current_value,
+    }
+
+# ----------------------------------------------------------------------- #
+#                             Cash
+# ----------------------------------------------------------------------- #
+def get_cash_totals():
+    return Cash.objects.aggregate(
+        main=Sum('num_open', filter=Q(description='m'), default=0.0),
+        deposits=Sum('num_open', filter=Q(description='d'), default=0.0),
+        interest=Sum('num_open', filter=Q(description='i'), default=0.0),
+    )
@@ -0,0 +1,105 @@
+from django.conf import settings
+
+from investments.models import Option, Share
+from investments.pricing import black_scholes, implied_volatility, years_to_expiry
+
+import numpy as np
+
+# ----------------------------------------------------------------------- #
+#                             Packing
+# ----------------------------------------------------------------------- #
+# Open positions are packed into column arrays, options first and then shares. A multiplier column
+#  (100 per option contract, 1 per share) lets both go through the same formulas as the model methods:
+#   current value = num_open * mid * multiplier                      (set_current_value)
+#   live G/L      = -num_open * cost_basis * multiplier + current     (get_live_gl)
+#   P&L           = live_pl * multiplier + current                    (calculate_pl)
+
+OPTION_MULTIPLIER = 100
+SHARE_MULTIPLIER = 1
+
+
+def pack_positions(all_active_options: list[Option], all_active_shares: list[Share], live_prices: dict):
+    live_option_prices, live_share_prices = live_prices['live_option_prices'], live_prices['live_share_prices']
+    option_quotes = [live_option_prices[option.id] for option in all_active_options]
+    positions = [*all_active_options, *all_active_shares]
+    num_options = len(all_active_options)
+
+    def column(values):
+        return np.fromiter(values, dtype=np.float64, count=len(positions))
+
+    return {
+        'ids': np.fromiter((position.id for position in positions), dtype=np.int64, count=len(positions)),
+        'is_option': np.arange(len(positions)) < num_options,
+        'tickers': np.array([position.ticker.nasdaq_name for position in positions], dtype=object),
+        'num_open': column(position.num_open for position in positions),
+        'cost_basis': column(position.cost_basis for position in positions),
+        'live_pl': column(position.live_pl for position in positions),
+        'multiplier': np.where(np.arange(len(positions)) < num_options, OPTION_MULTIPLIER, SHARE_MULTIPLIER).astype(np.float64),
+        'mid': column([*(quote[1] for quote in option_quotes), *(live_share_prices[share.id] for share in all_active_shares)]),
+        'theta': column([*(quote[2] for quote in option_quotes), *(0 for _ in all_active_shares)]),
+        'underlying_price': column([*(quote[0] for quote in option_quotes), *(live_share_prices[share.id] for share in all_active_shares)]),
+        # Contract terms, shares get placeholders that the option mask filters out
+        'strike_price': column([*(option.strike_price for option in all_active_options), *(np.nan for _ in all_active_shares)]),
+        'years': np.concatenate([years_to_expiry([option.expiration_date for option in all_active_options]), np.zeros(len(all_active_shares))]),
+        'is_call': np.array([*(option.direction == 'c' for option in all_active_options), *(False for _ in all_active_shares)], dtype=bool),
+    }
+
+# ----------------------------------------------------------------------- #
+#                             Evaluation
+# ----------------------------------------------------------------------- #
+def evaluate_positions(packed: dict):
+    current_value = packed['num_open'] * packed['mid'] * packed['multiplier']
+    live_gl = -packed['num_open'] * packed['cost_basis'] * packed['multiplier'] + current_value
+    pl = packed['live_pl'] * packed['multiplier'] + current_value
+
+    tickers, ticker_index = np.unique(packed['tickers'], return_inverse=True)
+    gains = np.bincount(ticker_index, weights=pl, minlength=len(tickers))
+
+    greeks = evaluate_greeks(packed)
+
+    return {
+        'current_value': current_value,
+        'delta': greeks['delta'],
+        'vega': greeks['vega'],
+        'total_delta': float((greeks['delta'] * packed['num_open'] * packed['multiplier']).sum()),
+        'total_vega': float((greeks['vega'] * packed['num_open'] * packed['multiplier']).sum()),
+        'live_gl': live_gl,
+        'pl': pl,
+        'gains_by_ticker': dict(zip(tickers.tolist(), gains.tolist())),
+        'total_current_value': float(current_value.sum()),
+        # Per-share daily theta summed over contracts, same units as the chain's theta
+        'total_theta': float((packed['theta'] * packed['num_open']).sum()),
+    }
+
+def evaluate_greeks(packed: dict):
+    # Delta and vega per unit for every position, shares have a delta of 1 and no vega. Options use
+    #  the vol implied by their own mid, or DEFAULT_IMPLIED_VOLATILITY when it can't be solved
+    is_option = packed['is_option']
+    delta = np.where(is_option, 0.0, 1.0)
+    vega = np.zeros(len(is_option))
+    if is_option.any():
+        spot, strike, years, is_call = (packed[column][is_option] for column in ('underlying_price', 'strike_price', 'years', 'is_call'))
+        greeks = black_scholes(spot, strike, years, get_implied_vols(packed)[is_option], is_call)
+        delta[is_option] = greeks['delta']
+        vega[is_option] = greeks['vega']
+
+    return {'delta': delta, 'vega': vega}
+
+def get_implied_vols(packed: dict):
+    # Vol implied by each option's mid, DEFAULT_IMPLIED_VOLATILITY when it can't be solved. 0 for shares
+    is_option = packed['is_option']
+    vols = np.zeros(len(is_option))
+    if is_option.any():
+        spot, strike, years, is_call = (packed[column][is_option] for column in ('underlying_price', 'strike_price', 'years', 'is_call'))
+        solved = implied_volatility(packed['mid'][is_option], spot, strike, years, is_call)
+        vols[is_option] = np.where(np.isnan(solved), settings.DEFAULT_IMPLIED_VOLATILITY, solved)
+
+    return vols
+
+def evaluate_portfolio(all_active_options: list[Option], all_active_shares: list[Share], live_prices: dict):
+    packed = pack_positions(all_active_options, all_active_shares, live_prices)
+    return packed | evaluate_positions(packed)
+
+def get_apy(total_theta: float, portfolio_value: float):
+    # % gained in a year if this theta were collected every day
+    return ((total_theta * OPTION_MULTIPLIER * 365) / portfolio_value) * 100 if portfolio_value else 0
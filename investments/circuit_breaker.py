@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import cache
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    # Per-endpoint breaker. State lives in the shared cache so every worker sees the same circuit:
+    #  THRESHOLD consecutive failures open it for COOLDOWN seconds, any success resets the count
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.failures_key = f"circuit_{endpoint}_failures"
+        self.open_key = f"circuit_{endpoint}_open"
+
+    def is_open(self):
+        return cache.get(self.open_key) is not None
+
+    def record_success(self):
+        cache.delete(self.failures_key)
+
+    def record_failure(self):
+        if cache.add(self.failures_key, 1, timeout=settings.CIRCUIT_BREAKER_COOLDOWN * 10):
+            failures = 1
+        else:
+            try:
+                failures = cache.incr(self.failures_key)
+            except ValueError:  # expired between add and incr
+                cache.add(self.failures_key, 1, timeout=settings.CIRCUIT_BREAKER_COOLDOWN * 10)
+                failures = 1
+
+        if failures >= settings.CIRCUIT_BREAKER_THRESHOLD:
+            logger.error(f"Opening circuit for {self.endpoint} after {failures} failures, cooling down for {settings.CIRCUIT_BREAKER_COOLDOWN}s")
+            cache.set(self.open_key, failures, timeout=settings.CIRCUIT_BREAKER_COOLDOWN)
+            cache.delete(self.failures_key)
+        return failures
@@ -9,4 +9,21 @@ class DataFetchError(Exception):
         super().__init__(self.message)
 
     def __str__(self):
-        return f"{self.message}\nResponse text: {self.response_text}"
\ No newline at end of file
+        return f"{self.message}\nResponse text: {self.response_text}"
+
+class CircuitOpenError(Exception):
+    """Exception raised instead of calling an endpoint whose circuit breaker is open."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.message = f"Circuit open for {endpoint}, skipping request"
+        super().__init__(self.message)
+
+class LedgerError(Exception):
+    """Exception raised when a transaction can't be applied to the positions it refers to."""
+
+    def __init__(self, transaction_id, reason: str):
+        self.transaction_id = transaction_id
+        self.reason = reason
+        self.message = f"Transaction {transaction_id}: {reason}"
+        super().__init__(self.message)
@@ -1,142 +1,587 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.core.cache import cache
+from django.db import connections
 
-from investments.models import Option, Share, Transaction, Ticker, Cash, PortfolioTracker
-from investments.error_models import DataFetchError
+from investments.models import Option, Share, Transaction, Ticker, Cash, PortfolioTracker, QuoteSnapshot
+from investments.error_models import DataFetchError, CircuitOpenError
+from investments.single_flight import coalesce, acoalesce
+from investments.analytics import evaluate_portfolio, get_apy
+from investments.pricing import implied_volatility, price_options, year_fraction
+from investments.history import record_point
+from investments.aggregations import get_closed_position_totals, get_cash_totals
+from investments.market_hours import quote_ttl, is_expired, is_quote_fresh
+from investments import market_data
 
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import asyncio
 import collections
+import httpx
+import numpy as np
 import logging
 import requests
 import datetime
+import threading
 
 logger = logging.getLogger(__name__)
 
+_quote_executor = None
+_quote_executor_lock = threading.Lock()
+
 # ----------------------------------------------------------------------- #
 #                             Main
 # ----------------------------------------------------------------------- #
-def get_live_prices():
-    all_active_options = Option.objects.exclude(num_open=0).order_by('expiration_date')
-    all_active_shares = Share.objects.exclude(num_open=0)
-
-    live_option_prices = get_all_live_option_info(all_active_options=all_active_options)
-    live_share_prices = get_all_live_share_info(all_active_shares)
-
+def load_positions():
+    # Open positions are loaded once, tickers joined, and the same objects flow through fetch,
+    #  update, stats and the template. Closed positions and cash are summed in the database
     return {
-        "live_option_prices": live_option_prices,
-        "live_share_prices": live_share_prices,
+        'all_active_options': list(Option.objects.exclude(num_open=0).select_related('ticker').order_by('expiration_date')),
+        'all_active_shares': list(Share.objects.exclude(num_open=0).select_related('ticker')),
+        'closed_totals': get_closed_position_totals(),
+        'cash_totals': get_cash_totals(),
     }
 
-def update_prices(live_prices: dict[str, dict]):
+def get_live_prices(positions: dict):
+    # Every quote goes out up front and is collected against one deadline so the page renders in bounded
+    #  time. Quotes that miss it keep fetching in the background and land in the cache for the next load
+    pending_options = request_live_option_info(positions['all_active_options'])
+    pending_shares = request_live_share_info(positions['all_active_shares'])
+    wait(set(pending_options.values()) | set(pending_shares.values()), timeout=settings.LIVE_PRICES_DEADLINE)
+
+    return resolve_live_prices(positions, set(pending_options), get_finished_results(pending_options), get_finished_results(pending_shares))
+
+def evaluate_prices(live_prices: dict[str, dict], positions: dict):
+    # Current values, live G/L, P&L and theta for every open position in one vectorized pass
     logger.debug(f"Live Prices: {live_prices}")
-    update_options_with_live_price(live_prices["live_option_prices"])
-    update_shares_with_live_price(live_prices["live_share_prices"])
+    return evaluate_portfolio(positions['all_active_options'], positions['all_active_shares'], live_prices)
+
+def update_prices(portfolio: dict, positions: dict):
+    is_option = portfolio['is_option']
+    update_options_with_live_price(portfolio['current_value'][is_option], positions['all_active_options'])
+    update_shares_with_live_price(portfolio['current_value'][~is_option], positions['all_active_shares'])
 
-def calculate_stats(live_prices):
-    return calculate_portfolio_gains(live_prices)
+def calculate_stats(portfolio: dict, positions: dict):
+    return calculate_portfolio_gains(portfolio, positions)
 
 
 # ----------------------------------------------------------------------- #
 #                             Get Live Prices
 # ----------------------------------------------------------------------- #
-def get_all_live_share_info(all_active_shares: list[Share]):
-    live_prices = {}
+def request_live_share_info(all_active_shares: list[Share]):
     api_key = settings.MARKET_DATA_API
-    for share in all_active_shares:
-        share_data = make_share_api_call(share.ticker, api_key)
-        live_prices[share.id] = share_data
-
-    return live_prices
+    return {
+        share.id: submit_quote_call(make_share_api_call, share.ticker, api_key)
+        for share in all_active_shares
+    }
 
-def get_all_live_option_info(all_active_options: list[Option]):
-    live_prices = {}
+def request_live_option_info(all_active_options: list[Option]):
+    # Returns {option.id: future of its chain}
     api_key = settings.MARKET_DATA_API
-    for option in all_active_options:
-        option_data = make_option_api_call(option.ticker, option.expiration_date.isoformat(), option.direction, option.strike_price, api_key)
-        live_prices[option.id] = option_data
+    pending = {}
+    for chain_key, options in group_option_chains(all_active_options).items():
+        future = submit_quote_call(make_option_chain_api_call, *chain_key, [option.strike_price for option in options], api_key)
+        pending |= {option.id: future for option in options}
 
-    return live_prices
+    return pending
 
-def make_share_api_call(ticker: str, api_key: str):
-    cache_key = f"share_price_{ticker}"
-    
-    if (cached_data := cache.get(cache_key)) is not None:
-        logger.info(f"Returned Cached Ticker Data for {ticker}")
-        return cached_data
-    
-    url = f"https://api.marketdata.app/v1/stocks/quotes/{ticker}/"
+def group_option_chains(all_active_options: list[Option]):
+    # Options sharing a ticker, expiry and side come back in the same chain, so fetch each chain once.
+    #  Expired options are left out, there is nothing left to quote
+    chains = collections.defaultdict(list)
+    for option in all_active_options:
+        if is_expired(option.expiration_date):
+            logger.info(f"Skipping quote for expired option {option}")
+            continue
+        chains[(option.ticker, option.expiration_date.isoformat(), option.direction)].append(option)
+
+    return chains
+
+def get_finished_results(pending: dict):
+    # {key: result} of the quote calls (pool futures or event loop tasks) that finished in time. A failed
+    #  fetch (breaker open, 5xx with no snapshot to fall back on) is left out like a late one
+    results = {}
+    failed = set()
+    for key, call in pending.items():
+        if not call.done():
+            continue
+        if (error := call.exception()) is None:
+            results[key] = call.result()
+        elif call not in failed:
+            failed.add(call)
+            logger.error(f"Quote fetch failed: {error}")
+
+    return results
+
+def resolve_live_prices(positions: dict, quoted_option_ids: set, option_results: dict, share_results: dict):
+    # Whatever didn't arrive in time falls back to the last known price and is reported as stale.
+    #  Options that weren't quoted (expired contracts still open) are carried at zero
+    live_option_prices, stale_option_ids = {}, []
+    for option in positions['all_active_options']:
+        if option.id not in quoted_option_ids:
+            live_option_prices[option.id] = (0, 0, 0)
+        elif (chain_data := option_results.get(option.id)) is not None:
+            live_option_prices[option.id] = chain_data[option.strike_price]
+        else:
+            logger.warning(f"No quote for {option} in time, using last known price")
+            live_option_prices[option.id] = get_fallback_option_quote(option)
+            stale_option_ids.append(option.id)
+
+    live_share_prices, stale_share_ids = {}, []
+    for share in positions['all_active_shares']:
+        if (price := share_results.get(share.id)) is not None:
+            live_share_prices[share.id] = price
+        else:
+            logger.warning(f"No quote for {share.ticker} in time, using last known price")
+            live_share_prices[share.id] = get_fallback_share_price(share)
+            stale_share_ids.append(share.id)
+
+    model_option_ids = fill_missing_option_quotes(positions['all_active_options'], positions['all_active_shares'], live_option_prices, live_share_prices)
+
+    return {
+        "live_option_prices": live_option_prices,
+        "live_share_prices": live_share_prices,
+        "stale_option_ids": stale_option_ids,
+        "stale_share_ids": stale_share_ids,
+        "model_option_ids": model_option_ids,
+    }
 
-    headers = {
-        'Accept': 'application/json',
-        'Authorization': f"Bearer {api_key}"
+def submit_quote_call(func, *args):
+    return get_quote_executor().submit(call_in_worker, func, *args)
+
+def get_quote_executor():
+    # One bounded pool per process, shared by every page load. It outlives the request so quotes that
+    #  miss a deadline can finish in the background
+    global _quote_executor
+    with _quote_executor_lock:
+        if _quote_executor is None:
+            _quote_executor = ThreadPoolExecutor(max_workers=settings.MARKET_DATA_MAX_WORKERS, thread_name_prefix="market-data")
+        return _quote_executor
+
+def call_in_worker(func, *args):
+    # Quote snapshots are read and written from pool threads, each of which gets its own db connection
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+
+def get_fallback_share_price(share: Share):
+    # Last known price: the stale cache copy, then the newest snapshot, then what the db was last valued at
+    if (stale_price := cache.get(get_stale_key(get_share_cache_key(share.ticker)))) is not None:
+        return stale_price
+    if (last_quote := QuoteSnapshot.get_latest_share_quote(share.ticker)) is not None:
+        return last_quote.mid
+    return (share.current_value or 0) / share.num_open
+
+def get_fallback_option_quote(option: Option):
+    cache_key = get_option_cache_key(option.ticker, option.expiration_date.isoformat(), option.direction, option.strike_price)
+    if (stale_quote := cache.get(get_stale_key(cache_key))) is not None:
+        return stale_quote
+    if (last_quote := QuoteSnapshot.get_latest_option_quote(option.ticker, option.expiration_date, option.direction, option.strike_price)) is not None:
+        return last_quote.as_option_quote()
+    return (0, (option.current_value or 0) / (option.num_open * 100), 0)
+
+def make_share_api_call(ticker: Ticker, api_key: str):
+    cache_key = get_share_cache_key(ticker)
+    return coalesce(
+        cache_key,
+        read=lambda: read_cached_quote(cache_key),
+        fetch=lambda: fetch_share_quote(ticker, api_key, cache_key),
+        read_stale=lambda: cache.get(get_stale_key(cache_key)),
+    )
+
+def fetch_share_quote(ticker: Ticker, api_key: str, cache_key: str):
+    last_quote = QuoteSnapshot.get_latest_share_quote(ticker)
+    if is_warm_start(last_quote, ticker):
+        write_cache_entries(get_quote_cache_entries(cache_key, last_quote.mid, timeout=quote_ttl()))
+        return last_quote.mid
+
+    try:
+        mid = parse_share_quote(ticker, market_data.get('stocks', f"quotes/{ticker}/", api_key))
+    except (DataFetchError, CircuitOpenError, requests.RequestException) as error:
+        mid, cache_entries = get_share_fallback(ticker, cache_key, last_quote, error)
+        write_cache_entries(cache_entries)
+        return mid
+
+    QuoteSnapshot.objects.create(ticker=ticker, mid=mid)
+    write_cache_entries(get_quote_cache_entries(cache_key, mid, timeout=quote_ttl()))
+    return mid
+
+def make_option_api_call(ticker: Ticker, expiration_timestamp: str, direction: str, strike_price: float, api_key: str):
+    return make_option_chain_api_call(ticker, expiration_timestamp, direction, [strike_price], api_key)[strike_price]
+
+def make_option_chain_api_call(ticker: Ticker, expiration_timestamp: str, direction: str, strike_prices: list[float], api_key: str):
+    # Returns {strike_price: (underlying_price, mid, theta)}, each strike still cached under its own key.
+    #  The whole chain is one fetch, so concurrent callers coalesce on the chain rather than per strike
+    cache_keys = get_chain_cache_keys(ticker, expiration_timestamp, direction, strike_prices)
+    return coalesce(
+        f"option_chain_{ticker}_{expiration_timestamp}_{direction}",
+        read=lambda: read_cached_chain(cache_keys),
+        fetch=lambda: fetch_option_chain(ticker, expiration_timestamp, direction, cache_keys, api_key),
+        read_stale=lambda: read_cached_chain(cache_keys, stale=True),
+    )
+
+def fetch_option_chain(ticker: Ticker, expiration_timestamp: str, direction: str, cache_keys: dict[float, str], api_key: str):
+    expiration_date = datetime.date.fromisoformat(expiration_timestamp)
+    cached = cache.get_many(list(cache_keys.values()))
+    last_quotes = {
+        strike_price: QuoteSnapshot.get_latest_option_quote(ticker, expiration_date, direction, strike_price)
+        for strike_price, cache_key in cache_keys.items() if cache_key not in cached
     }
-    response = requests.get(url, headers=headers)
+    chain_data, missing_strikes, cache_entries = plan_chain_fetch(ticker, direction, cache_keys, cached, last_quotes)
+
+    if missing_strikes:
+        fetched = {}
+        try:
+            response = market_data.get('options', f"chain/{ticker}/", api_key, params=get_chain_params(expiration_timestamp, direction, missing_strikes))
+            fetched = parse_option_chain(ticker, response)
+        except (DataFetchError, CircuitOpenError, requests.RequestException) as error:
+            logger.error(error)
+
+        new_quotes, fetched_entries = resolve_chain_quotes(ticker, expiration_timestamp, direction, cache_keys, missing_strikes, fetched, last_quotes, chain_data)
+        cache_entries += fetched_entries
+        QuoteSnapshot.objects.bulk_create(new_quotes)
+
+    write_cache_entries(cache_entries)
+    return chain_data
+
+# ----------------------------------------------------------------------- #
+#                             Quote Parsing
+# ----------------------------------------------------------------------- #
+# Everything between the reads and the writes, shared by the sync and async fetchers
+def is_warm_start(last_quote: QuoteSnapshot, label):
+    # A snapshot still inside its TTL (e.g. fetched before a restart) saves the request
+    if last_quote is None or not is_quote_fresh(last_quote.fetched_at):
+        return False
+    logger.info(f"Warm starting {label} from quote snapshot at {last_quote.fetched_at}")
+    return True
+
+def parse_share_quote(ticker: Ticker, response):
+    if response.status_code not in {200, 203}:
+        raise DataFetchError(ticker, response.status_code, response.text)
+    return float(response.json()['mid'][0])
+
+def get_share_fallback(ticker: Ticker, cache_key: str, last_quote: QuoteSnapshot, error: Exception):
+    # (mid, cache entries) from the last known quote, cached briefly so it is retried soon
+    if last_quote is None:
+        raise error
+    logger.error(error)
+    logger.warning(f"Using last known quote for {ticker} from {last_quote.fetched_at}")
+    return last_quote.mid, [(cache_key, last_quote.mid, settings.QUOTE_TTL_MARKET_OPEN)]
+
+def get_chain_params(expiration_timestamp: str, direction: str, strike_prices: list[float]):
+    side_name = 'put' if direction == 'p' else 'call'
+    low, high = min(strike_prices), max(strike_prices)
+    strike_filter = f"{low:g}" if low == high else f"{low:g}-{high:g}"
+    return {'expiration': expiration_timestamp, 'side': side_name, 'strike': strike_filter}
+
+def plan_chain_fetch(ticker: Ticker, direction: str, cache_keys: dict[float, str], cached: dict, last_quotes: dict):
+    # Splits a chain into strikes already answered by the cache or a fresh snapshot and the strikes the
+    #  request is for. Returns (chain_data, missing_strikes, cache entries for the warm starts)
+    chain_data, missing_strikes, cache_entries = {}, [], []
+    for strike_price, cache_key in cache_keys.items():
+        if cache_key in cached:
+            chain_data[strike_price] = cached[cache_key]
+        elif is_warm_start(last_quotes[strike_price], f"{ticker} {strike_price}{direction}"):
+            chain_data[strike_price] = last_quotes[strike_price].as_option_quote()
+            cache_entries += get_quote_cache_entries(cache_key, chain_data[strike_price], timeout=quote_ttl())
+        else:
+            missing_strikes.append(strike_price)
+
+    return chain_data, missing_strikes, cache_entries
+
+def parse_option_chain(ticker: Ticker, response):
+    # {strike_price: (underlying_price, mid, theta)} from a chain response
     if response.status_code not in {200, 203}:
         raise DataFetchError(ticker, response.status_code, response.text)
-    
     response = response.json()
-    cache.set(key=cache_key, value=float(response['mid'][0]), timeout=1800)
-    return float(response['mid'][0])
+    return {
+        float(strike): (response['underlyingPrice'][i], response['mid'][i], response['theta'][i])
+        for i, strike in enumerate(response['strike'])
+    }
 
+def resolve_chain_quotes(ticker: Ticker, expiration_timestamp: str, direction: str, cache_keys: dict[float, str], missing_strikes: list[float], fetched: dict, last_quotes: dict, chain_data: dict):
+    # Fills chain_data for the strikes we asked the API for: the fetched quote, else the last known
+    #  one, else zeros. Returns the snapshots to store and the cache entries to write. Fallbacks are
+    #  only cached for QUOTE_TTL_MARKET_OPEN so they're retried soon
+    expiration_date = datetime.date.fromisoformat(expiration_timestamp)
+    new_quotes = []
+    cache_entries = []
+    for strike_price in missing_strikes:
+        cache_key = cache_keys[strike_price]
+        if (local_response := fetched.get(float(strike_price))) is not None:
+            underlying_price, mid, theta = local_response
+            new_quotes.append(QuoteSnapshot(
+                ticker=ticker,
+                expiration_date=expiration_date,
+                direction=direction,
+                strike_price=strike_price,
+                mid=mid,
+                underlying_price=underlying_price,
+                theta=theta
+            ))
+            cache_entries += get_quote_cache_entries(cache_key, local_response, timeout=quote_ttl())
+        elif (last_quote := last_quotes[strike_price]) is not None:
+            logger.warning(f"Using last known quote for {ticker} {strike_price}{direction} from {last_quote.fetched_at}")
+            local_response = last_quote.as_option_quote()
+            cache_entries.append((cache_key, local_response, settings.QUOTE_TTL_MARKET_OPEN))
+        else:
+            logger.error(f"No chain data for {ticker} {strike_price}{direction} {expiration_timestamp}")
+            local_response = (0, 0, 0)
+            cache_entries.append((cache_key, local_response, settings.QUOTE_TTL_MARKET_OPEN))
+        chain_data[strike_price] = local_response
+
+    return new_quotes, cache_entries
 
-def make_option_api_call(ticker: str, expiration_timestamp: str, direction: str, strike_price: float, api_key: str):
-    cache_key = f'option_price_{ticker}_{expiration_timestamp}_{direction}_{strike_price}'
-    if (cached_data := cache.get(cache_key)) is not None:
-        logger.info(f"Returning Cached Option Data for {ticker}")
-        return cached_data
+# ----------------------------------------------------------------------- #
+#                             Quote Cache
+# ----------------------------------------------------------------------- #
+def get_share_cache_key(ticker: Ticker):
+    return f"share_price_{ticker}"
 
-    side_name = 'put' if direction == 'p' else 'call'
-    url = f"https://api.marketdata.app/v1/options/chain/{ticker}/?expiration={expiration_timestamp}&side={side_name}&strike={int(strike_price)}"
+def get_option_cache_key(ticker: str, expiration_timestamp: str, direction: str, strike_price: float):
+    return f'option_price_{ticker}_{expiration_timestamp}_{direction}_{strike_price}'
 
-    headers = {
-        'Accept': 'application/json',
-        'Authorization': f"Bearer {api_key}"
+def get_chain_cache_keys(ticker: Ticker, expiration_timestamp: str, direction: str, strike_prices: list[float]):
+    return {
+        strike_price: get_option_cache_key(ticker, expiration_timestamp, direction, strike_price)
+        for strike_price in set(strike_prices)
     }
-    response = requests.get(url, headers=headers)
-    if response.status_code not in {200, 203}:
-        logger.error(DataFetchError(ticker, response.status_code, response.text))
-        local_response = (0, 0, 0)
-        cache.set(key=cache_key, value=local_response, timeout=1800)
-        return local_response
 
-    response = response.json()
-    local_response = (response['underlyingPrice'][0], response['mid'][0], response['theta'][0])
-    cache.set(key=cache_key, value=local_response, timeout=1800)
-    return local_response
+def get_stale_key(cache_key: str):
+    return f"{cache_key}_stale"
+
+def get_quote_cache_entries(cache_key: str, value, timeout: int):
+    # [(key, value, timeout)], a second, longer lived copy can be served while a fresh quote is being fetched
+    return [(cache_key, value, timeout), (get_stale_key(cache_key), value, settings.STALE_QUOTE_TTL)]
+
+def write_cache_entries(cache_entries: list[tuple]):
+    for cache_key, value, timeout in cache_entries:
+        cache.set(key=cache_key, value=value, timeout=timeout)
+
+def read_cached_quote(cache_key: str):
+    return log_cache_hit(cache_key, cache.get(cache_key))
+
+def log_cache_hit(cache_key: str, cached_data):
+    if cached_data is not None:
+        logger.info(f"Returning Cached Data for {cache_key}")
+    return cached_data
+
+def read_cached_chain(cache_keys: dict[float, str], stale: bool = False):
+    read_keys = get_chain_read_keys(cache_keys, stale)
+    return get_cached_chain(read_keys, cache.get_many(list(read_keys.values())), stale)
+
+def get_chain_read_keys(cache_keys: dict[float, str], stale: bool):
+    return {strike_price: get_stale_key(cache_key) if stale else cache_key for strike_price, cache_key in cache_keys.items()}
+
+def get_cached_chain(read_keys: dict[float, str], cached: dict, stale: bool):
+    # Only a full hit counts, any missing strike means the chain has to be fetched
+    if any(cache_key not in cached for cache_key in read_keys.values()):
+        return None
+    if not stale:
+        logger.info(f"Returning Cached Option Data for {', '.join(read_keys.values())}")
+    return {strike_price: cached[cache_key] for strike_price, cache_key in read_keys.items()}
 
 # ----------------------------------------------------------------------- #
-#                             Update Prices
+#                             Async Quotes
 # ----------------------------------------------------------------------- #
-def update_options_with_live_price(live_option_prices):
-    all_active_options = Option.objects.exclude(num_open=0)
+# The same fetch, cache and fallback path for async views: quotes go out as tasks on the running loop
+#  over one httpx client instead of pool threads, and the in-flight markers are shared with the sync
+#  path so the refresher and a page load never fetch the same chain twice. Only the reads and writes
+#  differ, grouping, parsing, fallbacks and cache entries come from the helpers above
+_background_quote_tasks = set()
+
+async def aload_positions():
+    return {
+        'all_active_options': [option async for option in Option.objects.exclude(num_open=0).select_related('ticker').order_by('expiration_date')],
+        'all_active_shares': [share async for share in Share.objects.exclude(num_open=0).select_related('ticker')],
+        'closed_totals': await sync_to_async(get_closed_position_totals)(),
+        'cash_totals': await sync_to_async(get_cash_totals)(),
+    }
+
+async def aget_live_prices(positions: dict):
+    api_key = settings.MARKET_DATA_API
+    pending_options = {}
+    for chain_key, options in group_option_chains(positions['all_active_options']).items():
+        task = create_quote_task(amake_option_chain_api_call(*chain_key, [option.strike_price for option in options], api_key))
+        pending_options |= {option.id: task for option in options}
+    pending_shares = {
+        share.id: create_quote_task(amake_share_api_call(share.ticker, api_key))
+        for share in positions['all_active_shares']
+    }
+
+    # Tasks that miss the deadline are not cancelled, like the pool futures they finish into the cache.
+    #  That needs a loop that outlives the request, so this path is only used under ASGI
+    if pending := set(pending_options.values()) | set(pending_shares.values()):
+        await asyncio.wait(pending, timeout=settings.LIVE_PRICES_DEADLINE)
+
+    return await sync_to_async(resolve_live_prices)(positions, set(pending_options), get_finished_results(pending_options), get_finished_results(pending_shares))
+
+def create_quote_task(coroutine):
+    # The loop only keeps weak references to tasks, hold on to them until they finish
+    task = asyncio.get_running_loop().create_task(coroutine)
+    _background_quote_tasks.add(task)
+    task.add_done_callback(_background_quote_tasks.discard)
+    return task
+
+async def amake_share_api_call(ticker: Ticker, api_key: str):
+    cache_key = get_share_cache_key(ticker)
+    return await acoalesce(
+        cache_key,
+        read=lambda: aread_cached_quote(cache_key),
+        fetch=lambda: afetch_share_quote(ticker, api_key, cache_key),
+        read_stale=lambda: cache.aget(get_stale_key(cache_key)),
+    )
+
+async def afetch_share_quote(ticker: Ticker, api_key: str, cache_key: str):
+    last_quote = await QuoteSnapshot.aget_latest_share_quote(ticker)
+    if is_warm_start(last_quote, ticker):
+        await awrite_cache_entries(get_quote_cache_entries(cache_key, last_quote.mid, timeout=quote_ttl()))
+        return last_quote.mid
+
+    try:
+        mid = parse_share_quote(ticker, await market_data.aget('stocks', f"quotes/{ticker}/", api_key))
+    except (DataFetchError, CircuitOpenError, httpx.HTTPError) as error:
+        mid, cache_entries = get_share_fallback(ticker, cache_key, last_quote, error)
+        await awrite_cache_entries(cache_entries)
+        return mid
+
+    await QuoteSnapshot.objects.acreate(ticker=ticker, mid=mid)
+    await awrite_cache_entries(get_quote_cache_entries(cache_key, mid, timeout=quote_ttl()))
+    return mid
+
+async def amake_option_api_call(ticker: Ticker, expiration_timestamp: str, direction: str, strike_price: float, api_key: str):
+    return (await amake_option_chain_api_call(ticker, expiration_timestamp, direction, [strike_price], api_key))[strike_price]
+
+async def amake_option_chain_api_call(ticker: Ticker, expiration_timestamp: str, direction: str, strike_prices: list[float], api_key: str):
+    cache_keys = get_chain_cache_keys(ticker, expiration_timestamp, direction, strike_prices)
+    return await acoalesce(
+        f"option_chain_{ticker}_{expiration_timestamp}_{direction}",
+        read=lambda: aread_cached_chain(cache_keys),
+        fetch=lambda: afetch_option_chain(ticker, expiration_timestamp, direction, cache_keys, api_key),
+        read_stale=lambda: aread_cached_chain(cache_keys, stale=True),
+    )
+
+async def afetch_option_chain(ticker: Ticker, expiration_timestamp: str, direction: str, cache_keys: dict[float, str], api_key: str):
+    expiration_date = datetime.date.fromisoformat(expiration_timestamp)
+    cached = await cache.aget_many(list(cache_keys.values()))
+    last_quotes = {
+        strike_price: await QuoteSnapshot.aget_latest_option_quote(ticker, expiration_date, direction, strike_price)
+        for strike_price, cache_key in cache_keys.items() if cache_key not in cached
+    }
+    chain_data, missing_strikes, cache_entries = plan_chain_fetch(ticker, direction, cache_keys, cached, last_quotes)
+
+    if missing_strikes:
+        fetched = {}
+        try:
+            response = await market_data.aget('options', f"chain/{ticker}/", api_key, params=get_chain_params(expiration_timestamp, direction, missing_strikes))
+            fetched = parse_option_chain(ticker, response)
+        except (DataFetchError, CircuitOpenError, httpx.HTTPError) as error:
+            logger.error(error)
+
+        new_quotes, fetched_entries = resolve_chain_quotes(ticker, expiration_timestamp, direction, cache_keys, missing_strikes, fetched, last_quotes, chain_data)
+        cache_entries += fetched_entries
+        await QuoteSnapshot.objects.abulk_create(new_quotes)
+
+    await awrite_cache_entries(cache_entries)
+    return chain_data
+
+async def awrite_cache_entries(cache_entries: list[tuple]):
+    for cache_key, value, timeout in cache_entries:
+        await cache.aset(key=cache_key, value=value, timeout=timeout)
+
+async def aread_cached_quote(cache_key: str):
+    return log_cache_hit(cache_key, await cache.aget(cache_key))
+
+async def aread_cached_chain(cache_keys: dict[float, str], stale: bool = False):
+    read_keys = get_chain_read_keys(cache_keys, stale)
+    return get_cached_chain(read_keys, await cache.aget_many(list(read_keys.values())), stale)
 
+# ----------------------------------------------------------------------- #
+#                             Model Prices
+# ----------------------------------------------------------------------- #
+def fill_missing_option_quotes(all_active_options: list[Option], all_active_shares: list[Share], live_option_prices: dict, live_share_prices: dict):
+    # Open contracts still without a real quote (no chain data and no snapshot) are priced with
+    #  Black-Scholes, at the vol implied by their last snapshot if there is one. Returns the ids priced
+    missing = [
+        option for option in all_active_options
+        if not live_option_prices[option.id][0] and not is_expired(option.expiration_date)
+    ]
+    if not missing:
+        return []
+
+    spots = get_underlying_prices(all_active_options, all_active_shares, live_option_prices, live_share_prices, missing)
+    missing = [option for option in missing if spots.get(option.ticker_id)]
+    if not missing:
+        return []
+
+    last_quotes = [
+        QuoteSnapshot.get_latest_option_quote(option.ticker, option.expiration_date, option.direction, option.strike_price)
+        for option in missing
+    ]
+    implied_vols = implied_volatility(
+        price=[quote.mid if quote else np.nan for quote in last_quotes],
+        spot=[quote.underlying_price if quote else np.nan for quote in last_quotes],
+        strike=[option.strike_price for option in missing],
+        years=[year_fraction(option.expiration_date, quote.fetched_at) if quote else 0 for option, quote in zip(missing, last_quotes)],
+        is_call=[option.direction == 'c' for option in missing],
+    )
+    model = price_options(
+        spot=[spots[option.ticker_id] for option in missing],
+        strike=[option.strike_price for option in missing],
+        expiration_dates=[option.expiration_date for option in missing],
+        is_call=[option.direction == 'c' for option in missing],
+        vol=implied_vols,
+    )
+
+    for i, option in enumerate(missing):
+        logger.warning(f"No quote for {option}, using model price {model['price'][i]:.2f}")
+        live_option_prices[option.id] = (spots[option.ticker_id], float(model['price'][i]), float(model['theta'][i]))
+
+    return [option.id for option in missing]
+
+def get_underlying_prices(all_active_options: list[Option], all_active_shares: list[Share], live_option_prices: dict, live_share_prices: dict, missing: list[Option]):
+    # {ticker_id: price} from this load's quotes, topped up from snapshots for tickers nothing quoted
+    spots = {share.ticker_id: live_share_prices[share.id] for share in all_active_shares}
     for option in all_active_options:
-        option.set_current_value(live_option_prices[option.id][1])
+        if underlying_price := live_option_prices[option.id][0]:
+            spots.setdefault(option.ticker_id, underlying_price)
+
+    for option in missing:
+        if option.ticker_id not in spots:
+            spots[option.ticker_id] = QuoteSnapshot.get_latest_underlying_price(option.ticker)
+
+    return spots
+
+# ----------------------------------------------------------------------- #
+#                             Update Prices
+# ----------------------------------------------------------------------- #
+def update_options_with_live_price(current_values, all_active_options: list[Option]):
+    for option, current_value in zip(all_active_options, current_values.tolist()):
+        option.current_value = current_value
     
     Option.objects.bulk_update(all_active_options, ['current_value'])
 
-def update_shares_with_live_price(live_share_prices):
-    all_active_shares = Share.objects.exclude(num_open=0)
-
-    for share in all_active_shares:
-        share.set_current_value(live_share_prices[share.id])
+def update_shares_with_live_price(current_values, all_active_shares: list[Share]):
+    for share, current_value in zip(all_active_shares, current_values.tolist()):
+        share.current_value = current_value
     
     Share.objects.bulk_update(all_active_shares, ['current_value'])
 
 # ----------------------------------------------------------------------- #
 #                             Calculate Stats
 # ----------------------------------------------------------------------- #
-def calculate_portfolio_gains(live_prices):
+def calculate_portfolio_gains(portfolio: dict, positions: dict):
     oldest_portfolio_value, _ = PortfolioTracker.get_oldest_value()
-    live_option_prices, live_share_prices = live_prices["live_option_prices"], live_prices["live_share_prices"]
     
-    all_cash = Cash.objects.all()
-    main_val = Cash.objects.get(description='m').num_open
-    deposits_val = sum(cash.num_open for cash in all_cash if cash.description=='d')
+    cash_totals = positions['cash_totals']
+    main_val = cash_totals['main']
+    deposits_val = cash_totals['deposits']
     current_portfolio_value = deposits_val + main_val
 
-    gains_by_ticker, live_gls, current_theta, current_values = get_gains_by_ticker(live_option_prices)
+    gains_by_ticker, live_gls, current_theta, current_values = get_gains_by_ticker(portfolio, positions['closed_totals'])
 
-    interest_gains = sum(cash.num_open for cash in all_cash if cash.description=='i')
+    interest_gains = cash_totals['interest']
     total_gain = sum(gains_by_ticker.values()) + interest_gains
     total_cash = deposits_val + interest_gains + main_val
     current_portfolio_value += current_values
@@ -144,10 +589,11 @@ def calculate_portfolio_gains(live_prices):
 
     gain_comparison_num = oldest_portfolio_value + deposits_val
     pl_percentage = ((current_portfolio_value - gain_comparison_num) / gain_comparison_num) * 100 if oldest_portfolio_value else 0
-    apy = ((current_theta * 100 * 365) / current_portfolio_value) * 100 if current_portfolio_value else 0 # % gains if I get this theta daily for the year
+    apy = get_apy(current_theta, current_portfolio_value)
 
     # Create a new portfolio tracker if it
     PortfolioTracker.create_or_update_daily(current_portfolio_value=current_portfolio_value)
+    record_point(current_portfolio_value)
     
     return {
         'stats': {
@@ -156,43 +602,26 @@ def calculate_portfolio_gains(live_prices):
             'total_gain': total_gain,
             'pl_percentage': pl_percentage,
             'current_theta': current_theta * 100,
-            'APY':  apy
+            'APY':  apy,
+            'current_delta': portfolio['total_delta'],
+            'current_vega': portfolio['total_vega']
         },
         'gains_by_ticker': gains_by_ticker,
         'share_live_gl': live_gls['share_live_gl'],
         'option_live_gl': live_gls['option_live_gl']
     }
 
-def get_gains_by_ticker(live_option_prices):
-    all_options = Option.objects.all()
-    all_shares = Share.objects.all()
-
-    all_gains = collections.defaultdict(float)
-    option_live_gl = collections.defaultdict(float)
-    share_live_gl = collections.defaultdict(float)
-    curr_values = 0
-    curr_theta = 0
-
-    for option in all_options:
-        live_pl = option.calculate_pl()
-        logger.debug(f"{option.ticker.nasdaq_name} {live_pl}")
-        all_gains[option.ticker.nasdaq_name] += live_pl
-        curr_values += option.current_value
-        if option.is_open():
-            _, _, theta = live_option_prices.get(option.id)
-            curr_theta += theta * option.num_open
-            option_live_gl[option.id] = option.get_live_gl()
-
-    for share in all_shares:
-        all_gains[share.ticker.nasdaq_name] += share.calculate_pl()
-        logger.debug(f"{share.ticker.nasdaq_name} {share.calculate_pl()}")
-        curr_values += share.current_value
-        if share.is_open():
-            share_live_gl[share.id] = share.get_live_gl()
+def get_gains_by_ticker(portfolio: dict, closed_totals: dict):
+    # Closed positions arrive pre-summed from the database, open ones from the vectorized evaluation
+    all_gains = collections.defaultdict(float, closed_totals['gains_by_ticker'])
+    for ticker, gain in portfolio['gains_by_ticker'].items():
+        all_gains[ticker] += gain
 
+    is_option = portfolio['is_option']
     live_gls = {
-        'option_live_gl': dict(option_live_gl),
-        'share_live_gl': dict(share_live_gl)
+        'option_live_gl': dict(zip(portfolio['ids'][is_option].tolist(), portfolio['live_gl'][is_option].tolist())),
+        'share_live_gl': dict(zip(portfolio['ids'][~is_option].tolist(), portfolio['live_gl'][~is_option].tolist()))
     }
+    curr_values = closed_totals['current_value'] + portfolio['total_current_value']
 
-    return dict(all_gains), live_gls, curr_theta, curr_values
\ No newline at end of file
+    return dict(all_gains), live_gls, portfolio['total_theta'], curr_values
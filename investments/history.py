@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from investments.models import PortfolioHistoryPoint, PortfolioRollup, PortfolioTracker
+
+import datetime
+import itertools
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Portfolio value over time at three levels of detail:
+#   PortfolioHistoryPoint  every snapshot build, kept for PORTFOLIO_HISTORY_RETENTION_DAYS
+#   PortfolioRollup 'd'    daily OHLC from those points, PortfolioTracker covers days without any
+#   PortfolioRollup 'w'/'m' weekly and monthly OHLC from the daily rows
+#  Charts read whichever level fits the range and get it downsampled with LTTB
+
+DAY, WEEK, MONTH = 'd', 'w', 'm'
+
+def get_period_start(period: str, day: datetime.date):
+    if period == WEEK:
+        return day - datetime.timedelta(days=day.weekday())
+    if period == MONTH:
+        return day.replace(day=1)
+    return day
+
+def get_next_period_start(period: str, day: datetime.date):
+    start = get_period_start(period, day)
+    if period == WEEK:
+        return start + datetime.timedelta(days=7)
+    if period == MONTH:
+        return (start + datetime.timedelta(days=32)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+# ----------------------------------------------------------------------- #
+#                             Rollups
+# ----------------------------------------------------------------------- #
+def rollup_history(start: datetime.date, end: datetime.date = None):
+    # Rebuilds the daily rollups of [start, end] and every week and month touching them
+    end = end or timezone.localdate()
+    daily = get_daily_ohlc(start, end)
+
+    with transaction.atomic():
+        PortfolioRollup.objects.filter(period=DAY, start__range=(start, end)).delete()
+        PortfolioRollup.objects.bulk_create(PortfolioRollup(period=DAY, start=day, **ohlc) for day, ohlc in daily)
+
+        for period in (WEEK, MONTH):
+            first, after_last = get_period_start(period, start), get_next_period_start(period, end)
+            days = PortfolioRollup.objects.filter(period=DAY, start__gte=first, start__lt=after_last).order_by('start')
+            PortfolioRollup.objects.filter(period=period, start__gte=first, start__lt=after_last).delete()
+            PortfolioRollup.objects.bulk_create(
+                PortfolioRollup(period=period, start=period_start, **merge_ohlc(rows))
+                for period_start, rows in itertools.groupby(days.iterator(), key=lambda row: get_period_start(period, row.start))
+            )
+
+    logger.info(f"Rolled up portfolio history from {start} to {end}")
+
+def get_daily_ohlc(start: datetime.date, end: datetime.date):
+    # [(day, ohlc)] from the intraday points, days without points fall back to PortfolioTracker
+    points = (
+        PortfolioHistoryPoint.objects
+        .filter(recorded_at__date__range=(start, end))
+        .order_by('recorded_at')
+        .values_list('recorded_at', 'value')
+        .iterator()
+    )
+    daily = {}
+    for day, rows in itertools.groupby(points, key=lambda row: timezone.localdate(row[0])):
+        values = [value for _, value in rows]
+        daily[day] = {'open': values[0], 'high': max(values), 'low': min(values), 'close': values[-1], 'samples': len(values)}
+
+    for day, value in PortfolioTracker.objects.filter(date__range=(start, end)).values_list('date', 'value'):
+        daily.setdefault(day, {'open': value, 'high': value, 'low': value, 'close': value, 'samples': 1})
+
+    return sorted(daily.items())
+
+def merge_ohlc(rows):
+    rows = list(rows)
+    return {
+        'open': rows[0].open,
+        'high': max(row.high for row in rows),
+        'low': min(row.low for row in rows),
+        'close': rows[-1].close,
+        'samples': sum(row.samples for row in rows),
+    }
+
+def record_point(value: float):
+    # Today's rollups are kept current with every point, so older points can be pruned at any time
+    PortfolioHistoryPoint.objects.create(value=value)
+    today = timezone.localdate()
+    rollup_history(today, today)
+
+def prune_points():
+    older_than = timezone.now() - datetime.timedelta(days=settings.PORTFOLIO_HISTORY_RETENTION_DAYS)
+    return PortfolioHistoryPoint.prune(older_than=older_than)
+
+# ----------------------------------------------------------------------- #
+#                             Series
+# ----------------------------------------------------------------------- #
+def get_series(start: datetime.date, end: datetime.date, resolution: str = None):
+    # (resolution, [(timestamp, value)]). By default intraday points for short ranges and daily
+    #  closes for anything longer, weekly/monthly closes when asked for
+    if resolution is None:
+        resolution = 'intraday' if (end - start).days <= settings.PORTFOLIO_HISTORY_INTRADAY_DAYS else DAY
+
+    if resolution == 'intraday':
+        rows = (
+            PortfolioHistoryPoint.objects
+            .filter(recorded_at__date__range=(start, end))
+            .order_by('recorded_at')
+            .values_list('recorded_at', 'value')
+        )
+        return resolution, [(recorded_at.timestamp(), value) for recorded_at, value in rows.iterator()]
+
+    rows = (
+        PortfolioRollup.objects
+        .filter(period=resolution, start__range=(get_period_start(resolution, start), end))
+        .order_by('start')
+        .values_list('start', 'close')
+    )
+    return resolution, [
+        (datetime.datetime.combine(day, datetime.time(), tzinfo=timezone.get_current_timezone()).timestamp(), close)
+        for day, close in rows.iterator()
+    ]
+
+def lttb(points: list[tuple], threshold: int):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, from each bucket in between,
+    #  the point forming the largest triangle with the previous pick and the next bucket's average
+    if threshold >= len(points) or threshold < 3:
+        return points
+
+    x = np.fromiter((point[0] for point in points), dtype=np.float64, count=len(points))
+    y = np.fromiter((point[1] for point in points), dtype=np.float64, count=len(points))
+    edges = np.linspace(1, len(points) - 1, threshold - 1).astype(np.int64)
+
+    picked = [0]
+    for i in range(threshold - 2):
+        bucket = slice(edges[i], edges[i + 1])
+        next_bucket = slice(edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else slice(len(points) - 1, len(points))
+        next_x, next_y = x[next_bucket].mean(), y[next_bucket].mean()
+        prev_x, prev_y = x[picked[-1]], y[picked[-1]]
+        areas = np.abs((prev_x - next_x) * (y[bucket] - prev_y) - (prev_x - x[bucket]) * (next_y - prev_y))
+        picked.append(edges[i] + int(np.argmax(areas)))
+    picked.append(len(points) - 1)
+
+    return [points[i] for i in picked]
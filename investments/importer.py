@@ -0,0 +1,172 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.utils.dateparse import parse_date
+
+from investments.models import Option, Share, Cash, Ticker, Transaction, validate_option_direction
+from investments.ledger import POSITION_FIELDS, apply_trade
+from investments.error_models import LedgerError
+from investments.snapshot import invalidate_snapshot
+
+import collections
+import csv
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bulk import of a broker export. Columns match the create_transaction payload:
+#   date, security_type (share/option/cash), ticker, quantity, price,
+#   expiration_date, strike_price, direction (options), description (cash)
+#  Rows are applied in file order with the ledger's position math on in-memory rows, then written
+#  with bulk_create/bulk_update and a single update of the main cash row, all in one transaction
+
+FLUSH_SIZE = 2000
+
+# ----------------------------------------------------------------------- #
+#                             Import
+# ----------------------------------------------------------------------- #
+def import_transactions(lines, flush_size: int = FLUSH_SIZE):
+    with transaction.atomic():
+        state = load_import_state()
+        for line_number, row in enumerate(csv.DictReader(lines), start=2):
+            try:
+                import_row(state, line_number, row)
+            except (KeyError, ValueError, TypeError) as e:
+                raise LedgerError(f"on line {line_number}", f"invalid row ({e})")
+            if len(state['pending_transactions']) >= flush_size:
+                flush(state)
+
+        flush(state)
+        Share.objects.bulk_update([security for security in state['touched'].values() if isinstance(security, Share)], POSITION_FIELDS, batch_size=flush_size)
+        Option.objects.bulk_update([security for security in state['touched'].values() if isinstance(security, Option)], POSITION_FIELDS, batch_size=flush_size)
+
+        cash_adjustment = state['ledger']['cash'].get(state['ledger']['main_cash_id'], 0)
+        if cash_adjustment:
+            Cash.objects.filter(id=state['ledger']['main_cash_id']).update(num_open=F('num_open') + cash_adjustment)
+        transaction.on_commit(invalidate_snapshot)
+
+    summary = {'transactions': state['imported'], 'created': dict(state['created']), 'cash_adjustment': cash_adjustment}
+    logger.info(f"Imported transactions: {summary}")
+    return summary
+
+def load_import_state():
+    # In-memory lookup maps so resolving a known security never queries. Closed options are only reused
+    #  when there is no open contract with the same terms
+    main_cash = Cash.objects.get(description='m')
+    shares_by_ticker = collections.defaultdict(list)
+    for share in Share.objects.all():
+        shares_by_ticker[share.ticker_id].append(share)
+
+    options = {}
+    for option in Option.objects.order_by('id'):
+        key = get_option_key(option.ticker_id, option.expiration_date, option.strike_price, option.direction)
+        if key not in options or not options[key].num_open:
+            options[key] = option
+
+    return {
+        'tickers': {ticker.nasdaq_name: ticker for ticker in Ticker.objects.all()},
+        'options': options,
+        'content_types': ContentType.objects.get_for_models(Share, Option, Cash),
+        'ledger': {
+            'shares_by_ticker': shares_by_ticker,
+            'cash': {main_cash.id: 0.0},
+            'main_cash_id': main_cash.id,
+        },
+        'new_objects': collections.defaultdict(list),
+        'pending_transactions': [],
+        'touched': {},
+        'created': collections.Counter(),
+        'imported': 0,
+    }
+
+def import_row(state: dict, line_number: int, row: dict):
+    security_type = row['security_type'].strip().lower()
+    quantity = float(row['quantity'])
+    price = float(row['price'])
+    date = parse_date(row['date'].strip())
+    if date is None:
+        raise ValueError(f"bad date '{row['date']}'")
+
+    if security_type == 'cash':
+        # Only deposits and interest, the main row is adjusted by the trades themselves
+        description = (row.get('description') or 'd').strip().lower()
+        if description not in ('d', 'i'):
+            raise ValueError(f"cash description must be 'd' or 'i', got '{description}'")
+        security = Cash(num_open=quantity, description=description)
+        add_new_object(state, Cash, security)
+    else:
+        security = get_or_new_security(state, security_type, row)
+        for changed in apply_trade(state['ledger'], f"on line {line_number}", security, price, quantity):
+            state['touched'][id(changed)] = changed
+
+    state['pending_transactions'].append((security, date, price, quantity))
+    state['imported'] += 1
+
+# ----------------------------------------------------------------------- #
+#                             Lookups
+# ----------------------------------------------------------------------- #
+def get_option_key(ticker_id: int, expiration_date, strike_price: float, direction: str):
+    return (ticker_id, expiration_date, float(strike_price), direction)
+
+def get_ticker(state: dict, nasdaq_name: str):
+    # New tickers are rare and every other lookup is keyed by their id, so they're created right away
+    nasdaq_name = nasdaq_name.strip().upper()
+    if (ticker := state['tickers'].get(nasdaq_name)) is None:
+        ticker = Ticker.objects.create(nasdaq_name=nasdaq_name)
+        state['tickers'][nasdaq_name] = ticker
+        state['created'][Ticker.__name__] += 1
+    return ticker
+
+def get_or_new_security(state: dict, security_type: str, row: dict):
+    # New positions start empty, their first trade opens them the same way the create path does
+    ticker = get_ticker(state, row['ticker'])
+
+    if security_type == 'share':
+        shares = state['ledger']['shares_by_ticker'][ticker.id]
+        if len(shares) > 1:
+            raise ValueError(f"{ticker} has {len(shares)} share rows")
+        if not shares:
+            shares.append(Share(ticker=ticker, num_open=0, cost_basis=0, live_pl=0))
+            add_new_object(state, Share, shares[0])
+        return shares[0]
+
+    if security_type == 'option':
+        expiration_date = parse_date(row['expiration_date'].strip())
+        if expiration_date is None:
+            raise ValueError(f"bad expiration date '{row['expiration_date']}'")
+        direction = row['direction'].strip().lower()[:1]
+        validate_option_direction(direction)
+        key = get_option_key(ticker.id, expiration_date, row['strike_price'], direction)
+        if (option := state['options'].get(key)) is None:
+            option = Option(ticker=ticker, expiration_date=expiration_date, strike_price=float(row['strike_price']), direction=direction, num_open=0, cost_basis=0, live_pl=0)
+            state['options'][key] = option
+            add_new_object(state, Option, option)
+        return option
+
+    raise ValueError(f"unknown security type '{security_type}'")
+
+# ----------------------------------------------------------------------- #
+#                             Writes
+# ----------------------------------------------------------------------- #
+def add_new_object(state: dict, model, obj):
+    state['new_objects'][model].append(obj)
+    state['created'][model.__name__] += 1
+
+def flush(state: dict):
+    # Securities first so every transaction has an object_id. Securities created here
+    #  keep changing in memory and are written again by the final bulk_update
+    for model in (Share, Option, Cash):
+        model.objects.bulk_create(state['new_objects'].pop(model, []))
+
+    Transaction.objects.bulk_create([
+        Transaction(
+            date=date,
+            price=price,
+            quantity=quantity,
+            value=price * quantity,
+            content_type=state['content_types'][type(security)],
+            object_id=security.id,
+        )
+        for security, date, price, quantity in state['pending_transactions']
+    ])
+    state['pending_transactions'].clear()
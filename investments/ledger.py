@@ -0,0 +1,151 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from investments.models import Option, Share, Cash, Transaction
+from investments.analytics import OPTION_MULTIPLIER, SHARE_MULTIPLIER
+from investments.error_models import LedgerError
+from investments.snapshot import invalidate_snapshot
+
+import collections
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# Shares, options and the main cash row are mutated in place by transact(). The ledger replays every
+#  Transaction in (date, id) order onto in-memory copies of those rows, using the same model methods,
+#  so the stored values can be checked against (and rebuilt from) the transaction history.
+#  Transactions are streamed, memory grows with the number of positions and not of transactions
+
+POSITION_FIELDS = ('num_open', 'cost_basis', 'live_pl')
+DRIFT_TOLERANCE = 1e-6
+
+# ----------------------------------------------------------------------- #
+#                             Replay
+# ----------------------------------------------------------------------- #
+def new_ledger():
+    # Every position starts empty, its first transaction opens it just like the create path does
+    shares = {
+        share_id: Share(id=share_id, ticker_id=ticker_id, num_open=0, cost_basis=0, live_pl=0)
+        for share_id, ticker_id in Share.objects.values_list('id', 'ticker_id')
+    }
+    options = {
+        option_id: Option(id=option_id, ticker_id=ticker_id, direction=direction, num_open=0, cost_basis=0, live_pl=0)
+        for option_id, ticker_id, direction in Option.objects.values_list('id', 'ticker_id', 'direction')
+    }
+    cash_descriptions = dict(Cash.objects.values_list('id', 'description'))
+
+    shares_by_ticker = collections.defaultdict(list)
+    for share in shares.values():
+        shares_by_ticker[share.ticker_id].append(share)
+
+    return {
+        'shares': shares,
+        'options': options,
+        'shares_by_ticker': shares_by_ticker,
+        'cash': {cash_id: 0.0 for cash_id in cash_descriptions},
+        'main_cash_id': next((cash_id for cash_id, description in cash_descriptions.items() if description == 'm'), None),
+        'transactions': 0,
+        'errors': [],
+    }
+
+def replay_ledger(chunk_size: int = 2000):
+    ledger = new_ledger()
+    content_types = ContentType.objects.get_for_models(Share, Option, Cash)
+    securities = {
+        content_types[Share].id: ledger['shares'],
+        content_types[Option].id: ledger['options'],
+    }
+    cash_type_id = content_types[Cash].id
+
+    rows = (
+        Transaction.objects.order_by('date', 'id')
+        .values_list('id', 'content_type_id', 'object_id', 'price', 'quantity', 'value')
+        .iterator(chunk_size=chunk_size)
+    )
+    for transaction_id, content_type_id, object_id, price, quantity, value in rows:
+        ledger['transactions'] += 1
+        try:
+            if content_type_id == cash_type_id:
+                apply_cash(ledger, transaction_id, object_id, value)
+            elif (security := securities.get(content_type_id, {}).get(object_id)) is not None:
+                apply_trade(ledger, transaction_id, security, price, quantity)
+            else:
+                raise LedgerError(transaction_id, f"security {content_type_id}/{object_id} does not exist")
+        except LedgerError as e:
+            logger.warning(str(e))
+            ledger['errors'].append(str(e))
+
+    logger.info(f"Replayed {ledger['transactions']} transactions with {len(ledger['errors'])} errors")
+    return ledger
+
+def apply_trade(ledger: dict, transaction_id, security, price: float, quantity: float):
+    # Mirrors Share.transact() and Option.transact(), with the main cash row kept in the ledger.
+    #  Returns the position rows the trade changed, a covered call close also changes its share row
+    changed = [security]
+    if isinstance(security, Option) and security.closes_covered_call(quantity):
+        matching_shares = ledger['shares_by_ticker'][security.ticker_id]
+        if len(matching_shares) != 1:
+            raise LedgerError(transaction_id, f"covered call close needs exactly one share row, found {len(matching_shares)}")
+        security.apply_covered_call_close(matching_shares[0], price, quantity)
+        changed.append(matching_shares[0])
+    else:
+        multiplier = OPTION_MULTIPLIER if isinstance(security, Option) else SHARE_MULTIPLIER
+        security.update_cost_basis(price, quantity)
+        security.update_live_pl(price, quantity)
+        if ledger['main_cash_id'] is not None:
+            ledger['cash'][ledger['main_cash_id']] += price * multiplier * -quantity
+
+    security.update_num_open(quantity)
+    return changed
+
+def apply_cash(ledger: dict, transaction_id, cash_id: int, value: float):
+    # Cash transactions store the amount in value, quantity is an integer column and loses the cents
+    if cash_id not in ledger['cash']:
+        raise LedgerError(transaction_id, f"cash row {cash_id} does not exist")
+    ledger['cash'][cash_id] += value
+
+# ----------------------------------------------------------------------- #
+#                             Drift
+# ----------------------------------------------------------------------- #
+def find_drift(ledger: dict):
+    # [{model, id, field, stored, replayed}] for every stored value the history doesn't explain
+    drift = []
+    for model, replayed_rows in ((Share, ledger['shares']), (Option, ledger['options'])):
+        for row in model.objects.values('id', *POSITION_FIELDS).iterator():
+            replayed = replayed_rows[row['id']]
+            for field in POSITION_FIELDS:
+                if has_drifted(row[field], getattr(replayed, field)):
+                    drift.append(make_drift(model, row['id'], field, row[field], getattr(replayed, field)))
+
+    for cash_id, num_open in Cash.objects.values_list('id', 'num_open'):
+        if has_drifted(num_open, ledger['cash'][cash_id]):
+            drift.append(make_drift(Cash, cash_id, 'num_open', num_open, ledger['cash'][cash_id]))
+
+    return drift
+
+def has_drifted(stored, replayed):
+    return not math.isclose(stored or 0, replayed or 0, rel_tol=DRIFT_TOLERANCE, abs_tol=DRIFT_TOLERANCE)
+
+def make_drift(model, object_id: int, field: str, stored, replayed):
+    return {'model': model.__name__, 'id': object_id, 'field': field, 'stored': stored, 'replayed': replayed}
+
+# ----------------------------------------------------------------------- #
+#                             Repair
+# ----------------------------------------------------------------------- #
+def repair_drift(ledger: dict, drift: list[dict], batch_size: int = 500):
+    # Writes the replayed values over the drifted rows, one bulk_update per model
+    drifted_ids = collections.defaultdict(set)
+    for entry in drift:
+        drifted_ids[entry['model']].add(entry['id'])
+
+    with transaction.atomic():
+        for model, replayed_rows in ((Share, ledger['shares']), (Option, ledger['options'])):
+            rows = [replayed_rows[object_id] for object_id in drifted_ids[model.__name__]]
+            model.objects.bulk_update(rows, POSITION_FIELDS, batch_size=batch_size)
+
+        cash_rows = [Cash(id=cash_id, num_open=ledger['cash'][cash_id]) for cash_id in drifted_ids[Cash.__name__]]
+        Cash.objects.bulk_update(cash_rows, ['num_open'], batch_size=batch_size)
+        transaction.on_commit(invalidate_snapshot)
+
+    logger.info(f"Repaired {len(drift)} drifted values")
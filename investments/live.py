@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from investments.snapshot import SNAPSHOT_CACHE_KEY, SNAPSHOT_VERSION_CACHE_KEY, get_stats_payload, get_positions_payload
+
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Server-sent events for open dashboards. One task per process watches the snapshot version in the
+#  shared cache and fans every new snapshot out to all connected streams, so tabs never fetch quotes
+#  or rebuild anything themselves. A stream starts with a full 'snapshot' event, then gets 'delta'
+#  events with only the stats and positions that changed
+
+QUEUE_SIZE = 10
+
+# ----------------------------------------------------------------------- #
+#                             Payloads
+# ----------------------------------------------------------------------- #
+def get_live_payload(snapshot: dict):
+    stats = get_stats_payload(snapshot)
+    positions = get_positions_payload(snapshot)
+    return {
+        'version': snapshot['version'],
+        'generated_at': stats['generated_at'],
+        'stats': stats['stats'],
+        'gains_by_ticker': stats['gains_by_ticker'],
+        'positions': {
+            **{f"option-{option['id']}": option for option in positions['options']},
+            **{f"share-{share['id']}": share for share in positions['shares']},
+        },
+    }
+
+def get_delta(previous: dict, current: dict):
+    delta = {'version': current['version'], 'generated_at': current['generated_at']}
+    for key in ('stats', 'gains_by_ticker'):
+        if current[key] != previous[key]:
+            delta[key] = current[key]
+    delta['changed'] = {
+        key: position for key, position in current['positions'].items()
+        if previous['positions'].get(key) != position
+    }
+    delta['removed'] = [key for key in previous['positions'] if key not in current['positions']]
+    return delta
+
+def format_event(event: str, payload: dict):
+    return f"id: {payload['version']}\nevent: {event}\ndata: {json.dumps(payload)}\n\n"
+
+# ----------------------------------------------------------------------- #
+#                             Broadcaster
+# ----------------------------------------------------------------------- #
+class SnapshotBroadcaster:
+    def __init__(self):
+        self.subscribers = set()
+        self.payload = None
+        self._task = None
+
+    def subscribe(self):
+        # The watcher only runs while someone is listening
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.watch())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def watch(self):
+        # Polls only the small version key, the snapshot itself is read once per new version
+        version = None
+        while True:
+            try:
+                latest_version = await cache.aget(SNAPSHOT_VERSION_CACHE_KEY)
+                if latest_version is not None and latest_version != version:
+                    snapshot = await cache.aget(SNAPSHOT_CACHE_KEY)
+                    if snapshot is not None and snapshot['version'] == latest_version:
+                        version = latest_version
+                        self.publish(get_live_payload(snapshot))
+            except Exception:
+                logger.exception("Live snapshot watcher failed")
+            await asyncio.sleep(settings.LIVE_POLL_INTERVAL)
+
+    def publish(self, payload: dict):
+        previous, self.payload = self.payload, payload
+        event = format_event('snapshot', payload) if previous is None else format_event('delta', get_delta(previous, payload))
+        for queue in self.subscribers:
+            if queue.full():
+                # A stream that fell behind skips the missed deltas and gets the whole snapshot again
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(format_event('snapshot', payload))
+            else:
+                queue.put_nowait(event)
+        logger.debug(f"Published snapshot {payload['version']} to {len(self.subscribers)} streams")
+
+broadcaster = SnapshotBroadcaster()
+
+async def stream_events():
+    queue = broadcaster.subscribe()
+    try:
+        if broadcaster.payload is not None:
+            yield format_event('snapshot', broadcaster.payload)
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout=settings.LIVE_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                # Comment line, keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+    finally:
+        broadcaster.unsubscribe(queue)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from investments.importer import import_transactions
+from investments.error_models import LedgerError
+
+import time
+
+
+class Command(BaseCommand):
+    help = "Imports a CSV broker export of trades in one transaction, see investments/importer.py for the columns"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file to import")
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as f:
+                summary = import_transactions(f)
+        except LedgerError as e:
+            raise CommandError(f"Nothing imported. {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['transactions']} transactions in {time.monotonic() - start:.2f}s, "
+            f"created {summary['created']}, main cash adjusted by {summary['cash_adjustment']:.2f}"
+        ))
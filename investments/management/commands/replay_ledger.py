@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from investments.ledger import replay_ledger, find_drift, repair_drift
+
+import time
+
+
+class Command(BaseCommand):
+    help = "Replays every Transaction to rebuild positions and cash, and reports (or repairs) drift from the stored values"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help="Overwrite drifted values with the replayed ones")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Transactions fetched per database round trip")
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        ledger = replay_ledger(chunk_size=options['chunk_size'])
+        drift = find_drift(ledger)
+        self.stdout.write(f"Replayed {ledger['transactions']} transactions in {time.monotonic() - start:.2f}s")
+
+        for error in ledger['errors']:
+            self.stdout.write(self.style.WARNING(error))
+        for entry in drift:
+            self.stdout.write(f"{entry['model']} {entry['id']} {entry['field']}: stored {entry['stored']} replayed {entry['replayed']}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("No drift, stored positions match the transaction history"))
+        elif options['repair']:
+            repair_drift(ledger, drift)
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drift)} drifted values"))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} drifted values, rerun with --repair to fix them"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from investments.models import PortfolioTracker
+from investments.history import rollup_history
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the daily, weekly and monthly portfolio rollups, e.g. to backfill them from PortfolioTracker"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First day to rebuild (YYYY-MM-DD), defaults to the oldest tracked value")
+
+    def handle(self, *args, **options):
+        since = parse_date(options['since']) if options['since'] else PortfolioTracker.get_oldest_value()[1]
+        if since is None:
+            raise CommandError("Nothing to roll up, pass --since or record some portfolio values first")
+
+        rollup_history(since)
+        self.stdout.write(self.style.SUCCESS(f"Rolled up portfolio history since {since}"))
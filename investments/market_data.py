@@ -0,0 +1,145 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from investments.circuit_breaker import CircuitBreaker
+from investments.error_models import CircuitOpenError
+
+import asyncio
+import httpx
+import logging
+import os
+import random
+import requests
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://api.marketdata.app/v1"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+CIRCUIT_BREAKERS = {
+    'stocks': CircuitBreaker('stocks'),
+    'options': CircuitBreaker('options'),
+}
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+# httpx clients are tied to the event loop that opened their connections, so there is one per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+# ----------------------------------------------------------------------- #
+#                             Session
+# ----------------------------------------------------------------------- #
+def get_session():
+    # One keep-alive session per process so the TLS handshake is paid once per pooled connection,
+    #  not once per quote. Rebuilt after a fork so workers never share sockets
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.MARKET_DATA_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.headers.update({
+                'Accept': 'application/json',
+                'Accept-Encoding': 'gzip, deflate',
+            })
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+def get_async_client():
+    # The async counterpart of get_session(), one keep-alive client per event loop. Only used under
+    #  ASGI, where each worker runs one loop for its whole life
+    loop = asyncio.get_running_loop()
+    if (client := _async_clients.get(loop)) is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=settings.MARKET_DATA_POOL_SIZE, max_keepalive_connections=settings.MARKET_DATA_POOL_SIZE),
+            timeout=httpx.Timeout(settings.MARKET_DATA_READ_TIMEOUT, connect=settings.MARKET_DATA_CONNECT_TIMEOUT),
+            headers={
+                'Accept': 'application/json',
+                'Accept-Encoding': 'gzip, deflate',
+            },
+        )
+        _async_clients[loop] = client
+    return client
+
+# ----------------------------------------------------------------------- #
+#                             Requests
+# ----------------------------------------------------------------------- #
+def get(endpoint: str, path: str, api_key: str, params: dict = None):
+    # GET {BASE_URL}/{endpoint}/{path} through the endpoint's circuit breaker. 429/5xx responses and
+    #  connection errors are retried with full-jitter exponential backoff, and only count against the
+    #  breaker once retries run out
+    breaker = CIRCUIT_BREAKERS[endpoint]
+    if breaker.is_open():
+        raise CircuitOpenError(endpoint)
+
+    url = f"{BASE_URL}/{endpoint}/{path}"
+    headers = {'Authorization': f"Bearer {api_key}"}
+    for attempt in range(settings.MARKET_DATA_MAX_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            response = get_session().get(
+                url,
+                params=params,
+                headers=headers,
+                timeout=(settings.MARKET_DATA_CONNECT_TIMEOUT, settings.MARKET_DATA_READ_TIMEOUT)
+            )
+        except requests.RequestException as error:
+            logger.warning(f"GET {url} {params or ''} failed after {(time.perf_counter() - start) * 1000:.0f}ms: {error}")
+            response, last_error = None, error
+        else:
+            logger.info(f"GET {url} {params or ''} -> {response.status_code} in {(time.perf_counter() - start) * 1000:.0f}ms")
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                breaker.record_success()
+                return response
+
+        if attempt < settings.MARKET_DATA_MAX_RETRIES:
+            delay = get_backoff_delay(attempt, response)
+            logger.warning(f"Retrying {endpoint} request in {delay:.2f}s (attempt {attempt + 1}, status {getattr(response, 'status_code', None)})")
+            time.sleep(delay)
+
+    breaker.record_failure()
+    if response is None:
+        raise last_error
+    return response
+
+async def aget(endpoint: str, path: str, api_key: str, params: dict = None):
+    # get() on the async client, same retries, backoff and circuit breaker
+    breaker = CIRCUIT_BREAKERS[endpoint]
+    if await sync_to_async(breaker.is_open)():
+        raise CircuitOpenError(endpoint)
+
+    url = f"{BASE_URL}/{endpoint}/{path}"
+    headers = {'Authorization': f"Bearer {api_key}"}
+    for attempt in range(settings.MARKET_DATA_MAX_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            response = await get_async_client().get(url, params=params, headers=headers)
+        except httpx.HTTPError as error:
+            logger.warning(f"GET {url} {params or ''} failed after {(time.perf_counter() - start) * 1000:.0f}ms: {error}")
+            response, last_error = None, error
+        else:
+            logger.info(f"GET {url} {params or ''} -> {response.status_code} in {(time.perf_counter() - start) * 1000:.0f}ms")
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                await sync_to_async(breaker.record_success)()
+                return response
+
+        if attempt < settings.MARKET_DATA_MAX_RETRIES:
+            delay = get_backoff_delay(attempt, response)
+            logger.warning(f"Retrying {endpoint} request in {delay:.2f}s (attempt {attempt + 1}, status {getattr(response, 'status_code', None)})")
+            await asyncio.sleep(delay)
+
+    await sync_to_async(breaker.record_failure)()
+    if response is None:
+        raise last_error
+    return response
+
+def get_backoff_delay(attempt: int, response=None):
+    backoff = min(settings.MARKET_DATA_BACKOFF_CAP, settings.MARKET_DATA_BACKOFF_BASE * 2 ** attempt)
+    # Honour the provider's Retry-After on 429s, capped so we never stall a page load for long
+    if response is not None and (retry_after := response.headers.get('Retry-After', '')).isdigit():
+        return min(settings.MARKET_DATA_BACKOFF_CAP, float(retry_after))
+    return random.uniform(0, backoff)
@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.utils import timezone
+
+from zoneinfo import ZoneInfo
+
+import datetime
+import functools
+
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+MARKET_OPEN = datetime.time(9, 30)
+MARKET_CLOSE = datetime.time(16, 0)
+
+
+# ----------------------------------------------------------------------- #
+#                             Calendar
+# ----------------------------------------------------------------------- #
+@functools.lru_cache(maxsize=16)
+def market_holidays(year: int):
+    # Full-day NYSE closures. Holidays on a Saturday are observed the Friday before, on a Sunday the
+    #  Monday after (except New Year's Day, which is not moved back into the previous year)
+    def observed(day):
+        if day.weekday() == 5:
+            return day - datetime.timedelta(days=1)
+        if day.weekday() == 6:
+            return day + datetime.timedelta(days=1)
+        return day
+
+    def nth_weekday(month, weekday, n):
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+    def last_weekday(month, weekday):
+        last = datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)
+        return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+    holidays = {
+        nth_weekday(1, 0, 3),  # Martin Luther King Jr. Day
+        nth_weekday(2, 0, 3),  # Washington's Birthday
+        easter(year) - datetime.timedelta(days=2),  # Good Friday
+        last_weekday(5, 0),  # Memorial Day
+        observed(datetime.date(year, 7, 4)),
+        nth_weekday(9, 0, 1),  # Labor Day
+        nth_weekday(11, 3, 4),  # Thanksgiving
+        observed(datetime.date(year, 12, 25)),
+    }
+    if (new_years := observed(datetime.date(year, 1, 1))).year == year:
+        holidays.add(new_years)
+    if year >= 2022:
+        holidays.add(observed(datetime.date(year, 6, 19)))  # Juneteenth
+
+    return frozenset(holidays)
+
+def easter(year: int):
+    # Anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+def is_trading_day(day: datetime.date):
+    return day.weekday() < 5 and day not in market_holidays(day.year)
+
+# ----------------------------------------------------------------------- #
+#                             Sessions
+# ----------------------------------------------------------------------- #
+def is_market_open(now: datetime.datetime = None):
+    market_now = (now or timezone.now()).astimezone(MARKET_TIMEZONE)
+    return is_trading_day(market_now.date()) and MARKET_OPEN <= market_now.time() < MARKET_CLOSE
+
+def previous_close(now: datetime.datetime = None):
+    # Most recent regular session close at or before now
+    market_now = (now or timezone.now()).astimezone(MARKET_TIMEZONE)
+    day = market_now.date()
+    if market_now.time() < MARKET_CLOSE:
+        day -= datetime.timedelta(days=1)
+    while not is_trading_day(day):
+        day -= datetime.timedelta(days=1)
+
+    return datetime.datetime.combine(day, MARKET_CLOSE, tzinfo=MARKET_TIMEZONE)
+
+def next_open(now: datetime.datetime = None):
+    # Next regular session open strictly after now
+    market_now = (now or timezone.now()).astimezone(MARKET_TIMEZONE)
+    day = market_now.date()
+    if market_now.time() >= MARKET_OPEN:
+        day += datetime.timedelta(days=1)
+    while not is_trading_day(day):
+        day += datetime.timedelta(days=1)
+
+    return datetime.datetime.combine(day, MARKET_OPEN, tzinfo=MARKET_TIMEZONE)
+
+# ----------------------------------------------------------------------- #
+#                             Quote Policy
+# ----------------------------------------------------------------------- #
+def quote_ttl(now: datetime.datetime = None):
+    # Short-lived quotes while the market trades. Once it closes, prices stop moving, so hold the
+    #  closing quote until the next session opens
+    now = now or timezone.now()
+    if is_market_open(now):
+        return settings.QUOTE_TTL_MARKET_OPEN
+
+    return max(int((next_open(now) - now).total_seconds()), settings.QUOTE_TTL_MARKET_OPEN)
+
+def is_expired(expiration_date: datetime.date, now: datetime.datetime = None):
+    # Contracts trade until the close on their expiration date
+    market_now = (now or timezone.now()).astimezone(MARKET_TIMEZONE)
+    return expiration_date < market_now.date() or (
+        expiration_date == market_now.date() and market_now.time() >= MARKET_CLOSE
+    )
+
+def is_quote_fresh(fetched_at: datetime.datetime, now: datetime.datetime = None):
+    # Whether a quote fetched at fetched_at would still be inside its quote_ttl() now
+    now = now or timezone.now()
+    if is_market_open(now):
+        return now - fetched_at < datetime.timedelta(seconds=settings.QUOTE_TTL_MARKET_OPEN)
+
+    return fetched_at >= previous_close(now)
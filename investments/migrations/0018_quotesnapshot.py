@@ -0,0 +1,96 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investments", "0017_alter_cash_description"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuoteSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "expiration_date",
+                    models.DateField(blank=True, null=True, verbose_name="Expiry Date"),
+                ),
+                (
+                    "strike_price",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Strike Price"
+                    ),
+                ),
+                (
+                    "direction",
+                    models.CharField(
+                        blank=True,
+                        choices=[("p", "PUT"), ("c", "CALL")],
+                        max_length=1,
+                        null=True,
+                    ),
+                ),
+                ("mid", models.FloatField(verbose_name="Mid Price")),
+                (
+                    "underlying_price",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Underlying Price"
+                    ),
+                ),
+                (
+                    "theta",
+                    models.FloatField(blank=True, null=True, verbose_name="Theta"),
+                ),
+                (
+                    "fetched_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="When was this quote fetched?",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[("api", "Market Data API")],
+                        default="api",
+                        max_length=3,
+                    ),
+                ),
+                (
+                    "ticker",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="investments.ticker",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=[
+                            "ticker",
+                            "expiration_date",
+                            "direction",
+                            "strike_price",
+                            "-fetched_at",
+                        ],
+                        name="quote_security_latest_idx",
+                    ),
+                    models.Index(fields=["fetched_at"], name="quote_fetched_at_idx"),
+                ],
+            },
+        ),
+    ]
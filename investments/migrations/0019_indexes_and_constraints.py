@@ -0,0 +1,62 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("investments", "0018_quotesnapshot"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="portfoliotracker",
+            name="date",
+            field=models.DateField(
+                unique=True, verbose_name="When was this value accrued?"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="ticker",
+            name="nasdaq_name",
+            field=models.CharField(
+                max_length=5, unique=True, verbose_name="Nasdaq Ticker Name"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="option",
+            index=models.Index(
+                condition=models.Q(("num_open", 0), _negated=True),
+                fields=["expiration_date"],
+                name="option_open_expiry_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="share",
+            index=models.Index(
+                condition=models.Q(("num_open", 0), _negated=True),
+                fields=["ticker"],
+                name="share_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["content_type", "object_id"], name="transaction_security_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(fields=["date", "id"], name="transaction_date_id_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="cash",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("description", "m")),
+                fields=("description",),
+                name="cash_single_main",
+            ),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investments", "0019_indexes_and_constraints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PortfolioHistoryPoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "recorded_at",
+                    models.DateTimeField(
+                        db_index=True,
+                        default=django.utils.timezone.now,
+                        verbose_name="When was this value recorded?",
+                    ),
+                ),
+                (
+                    "value",
+                    models.FloatField(verbose_name="What was the portfolio valued at?"),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PortfolioRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("d", "Day"), ("w", "Week"), ("m", "Month")],
+                        max_length=1,
+                    ),
+                ),
+                ("start", models.DateField(verbose_name="First day of the period")),
+                ("open", models.FloatField()),
+                ("high", models.FloatField()),
+                ("low", models.FloatField()),
+                ("close", models.FloatField()),
+                (
+                    "samples",
+                    models.IntegerField(
+                        default=1, verbose_name="How many values went into this period"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("period", "start"), name="portfolio_rollup_period_start"
+                    )
+                ],
+            },
+        ),
+    ]
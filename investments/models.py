@@ -17,7 +17,7 @@ def validate_ticker_type(value):
 
 # Create your models here.
 class Ticker(models.Model):
-    nasdaq_name = models.CharField("Nasdaq Ticker Name", max_length=5)
+    nasdaq_name = models.CharField("Nasdaq Ticker Name", max_length=5, unique=True)
     name = models.CharField("Full Name of Stock", max_length=20, blank=True, null=True)
     type = models.CharField(max_length=3, choices=[
         ("sto", "Stock"),
@@ -61,10 +61,10 @@ class Security(models.Model):
             logger.info("This is a closing transaction")
     
     def update_cash_value(self, price, quantity):
+        # A single UPDATE with an F() increment, concurrent trades can't overwrite each other's balance
         logger.info(f"updating cash value for {self}")
-        deposit_cash = Cash.objects.get(description='m')
-        deposit_cash.num_open += price * -quantity
-        deposit_cash.save()
+        if not Cash.objects.filter(description='m').update(num_open=models.F('num_open') + price * -quantity):
+            raise Cash.DoesNotExist("Main cash row does not exist")
 
     class Meta:
         abstract = True
@@ -73,6 +73,12 @@ class Security(models.Model):
         return(f"{self.num_open}: {self.ticker}")
 
 class Share(Security):
+    class Meta:
+        indexes = [
+            # Only open positions are loaded for the dashboard
+            models.Index(fields=['ticker'], condition=~models.Q(num_open=0), name='share_open_idx'),
+        ]
+
     def set_current_value(self, live_price):
         self.current_value = self.num_open * live_price
         logger.debug(f"Updating Curr Value of Share: {self.num_open} {live_price} {self.current_value}")
@@ -107,6 +113,13 @@ class Option(Security):
     expiration_date = models.DateField('Expiry Date')
     strike_price = models.FloatField("Strike Price")
     direction = models.CharField(max_length=1, choices=[('p', 'PUT'), ('c', 'CALL')], validators=[validate_option_direction])
+
+    class Meta:
+        indexes = [
+            # Open contracts are loaded in expiration order, closed ones are only ever aggregated
+            models.Index(fields=['expiration_date'], condition=~models.Q(num_open=0), name='option_open_expiry_idx'),
+        ]
+
     def set_current_value(self, live_price):
         self.current_value = self.num_open * live_price * 100
         logger.debug(f"Updating Curr Value of Option: {self.num_open} {live_price} {self.current_value}")
@@ -122,7 +135,7 @@ class Option(Security):
         return all_cost_basis + self.current_value
     
     def transact(self, price, quantity):
-        if self.num_open < 0 and quantity > 0 and self.direction == 'c':
+        if self.closes_covered_call(quantity):
             self.close_covered_call(price, quantity) # updates cost basis and live_pl as well
         else:
             self.update_cost_basis(price, quantity)
@@ -131,17 +144,24 @@ class Option(Security):
         
         self.update_num_open(quantity)
 
+    def closes_covered_call(self, quantity):
+        return self.num_open < 0 and quantity > 0 and self.direction == 'c'
+
     # if we close a covered call, we want to reduce the cost basis of the stock instead of changing the total gains
     def close_covered_call(self, price, quantity):
         logger.info(f"Closing Covered Call {self}")
+        share = Share.objects.get(ticker=self.ticker)
+        self.apply_covered_call_close(share, price, quantity)
+        share.save()
+
+    # the math of close_covered_call without any queries, the ledger replay runs it on in-memory rows
+    def apply_covered_call_close(self, share, price, quantity):
         overall_profit_from_this_trade = (self.cost_basis - price) * quantity * 100 #positive if its a profit, negative otherwise
         self.live_pl += (overall_profit_from_this_trade / 100)
         logger.info(f"Overall Profit from this Closure: {overall_profit_from_this_trade}")
         # apply this value to the current stock cost basis
-        share = Share.objects.get(ticker=self.ticker)
         old_cost_basis = share.cost_basis
         share.cost_basis = old_cost_basis - (share.num_open / overall_profit_from_this_trade)
-        share.save()
         logger.info(f'reducing cost basis by { overall_profit_from_this_trade / share.num_open}')
         logger.info(f'old cost basis {old_cost_basis} new cost basis {share.cost_basis}')
 
@@ -158,6 +178,12 @@ class Option(Security):
 class Cash(models.Model):
     num_open = models.FloatField("Owned Cash", default=1)
     description = models.CharField(max_length=1, choices=[("d", "Deposit"), ("i", "Interest"), ('m', "Main")], default='d')
+
+    class Meta:
+        constraints = [
+            # Trades look the main balance up with Cash.objects.get(description='m')
+            models.UniqueConstraint(fields=['description'], condition=models.Q(description='m'), name='cash_single_main'),
+        ]
     
     def __str__(self):
         return(f"{self.num_open}: {self.description}")
@@ -173,6 +199,13 @@ class Transaction(models.Model):
     object_id = models.PositiveIntegerField()
     security = GenericForeignKey('content_type', 'object_id')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'], name='transaction_security_idx'),
+            # Keyset pagination of the history API
+            models.Index(fields=['date', 'id'], name='transaction_date_id_idx'),
+        ]
+
     def __str__(self):
         s_or_b = "Sell" if self.quantity < 1 else "Buy"
         return f"{s_or_b} {self.date}: {self.quantity} {self.security} @${self.price} | {self.value}"
@@ -180,7 +213,7 @@ class Transaction(models.Model):
 
 class PortfolioTracker(models.Model):
     value = models.FloatField("What was the portfolio valued at?")
-    date = models.DateField("When was this value accrued?")
+    date = models.DateField("When was this value accrued?", unique=True)
 
     @classmethod
     def get_oldest_value(cls):
@@ -205,4 +238,106 @@ class PortfolioTracker(models.Model):
         return obj, created
     
     def __str__(self):
-        return f"{self.date}: {self.value}"
\ No newline at end of file
+        return f"{self.date}: {self.value}"
+
+
+class PortfolioHistoryPoint(models.Model):
+    # Portfolio value every time a snapshot is built. Rolled up into PortfolioRollup and pruned
+    #  after PORTFOLIO_HISTORY_RETENTION_DAYS, so this only ever holds recent intraday data
+    recorded_at = models.DateTimeField("When was this value recorded?", default=timezone.now, db_index=True)
+    value = models.FloatField("What was the portfolio valued at?")
+
+    @classmethod
+    def prune(cls, older_than):
+        deleted, _ = cls.objects.filter(recorded_at__lt=older_than).delete()
+        if deleted:
+            logger.info(f"Pruned {deleted} portfolio history points older than {older_than}")
+        return deleted
+
+    def __str__(self):
+        return f"{self.recorded_at}: {self.value}"
+
+
+class PortfolioRollup(models.Model):
+    # Open/high/low/close of the portfolio value per day, week (starting Monday) or month
+    period = models.CharField(max_length=1, choices=[('d', 'Day'), ('w', 'Week'), ('m', 'Month')])
+    start = models.DateField("First day of the period")
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    samples = models.IntegerField("How many values went into this period", default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'start'], name='portfolio_rollup_period_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_period_display()} {self.start}: {self.close}"
+
+
+class QuoteSnapshot(models.Model):
+    # Every quote fetched from the market data API, by security. Shares leave the option fields empty
+    ticker = models.ForeignKey(Ticker, on_delete=models.CASCADE)
+    expiration_date = models.DateField('Expiry Date', null=True, blank=True)
+    strike_price = models.FloatField("Strike Price", null=True, blank=True)
+    direction = models.CharField(max_length=1, null=True, blank=True, choices=[('p', 'PUT'), ('c', 'CALL')])
+    mid = models.FloatField("Mid Price")
+    underlying_price = models.FloatField("Underlying Price", null=True, blank=True)
+    theta = models.FloatField("Theta", null=True, blank=True)
+    fetched_at = models.DateTimeField("When was this quote fetched?", default=timezone.now)
+    source = models.CharField(max_length=3, choices=[('api', 'Market Data API')], default='api')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ticker', 'expiration_date', 'direction', 'strike_price', '-fetched_at'], name='quote_security_latest_idx'),
+            models.Index(fields=['fetched_at'], name='quote_fetched_at_idx'),
+        ]
+
+    @classmethod
+    def get_latest_share_quote(cls, ticker):
+        return cls.objects.filter(ticker=ticker, expiration_date=None).order_by('-fetched_at').first()
+
+    @classmethod
+    def get_latest_option_quote(cls, ticker, expiration_date, direction, strike_price):
+        return cls.objects.filter(
+            ticker=ticker,
+            expiration_date=expiration_date,
+            direction=direction,
+            strike_price=strike_price
+        ).order_by('-fetched_at').first()
+
+    @classmethod
+    async def aget_latest_share_quote(cls, ticker):
+        return await cls.objects.filter(ticker=ticker, expiration_date=None).order_by('-fetched_at').afirst()
+
+    @classmethod
+    async def aget_latest_option_quote(cls, ticker, expiration_date, direction, strike_price):
+        return await cls.objects.filter(
+            ticker=ticker,
+            expiration_date=expiration_date,
+            direction=direction,
+            strike_price=strike_price
+        ).order_by('-fetched_at').afirst()
+
+    @classmethod
+    def get_latest_underlying_price(cls, ticker):
+        # Newest price of the stock itself, from a share quote or an option's underlying
+        if (latest := cls.objects.filter(ticker=ticker).order_by('-fetched_at').first()) is None:
+            return None
+        return latest.mid if latest.expiration_date is None else latest.underlying_price
+
+    @classmethod
+    def prune(cls, older_than):
+        deleted, _ = cls.objects.filter(fetched_at__lt=older_than).delete()
+        return deleted
+
+    def as_option_quote(self):
+        # Same shape as the live option prices: (underlying_price, mid, theta)
+        return (self.underlying_price, self.mid, self.theta)
+
+    def __str__(self):
+        if self.expiration_date is None:
+            return f"{self.ticker} @ {self.mid} ({self.fetched_at})"
+        return f"{self.ticker} {self.strike_price}{self.direction} {self.expiration_date} @ {self.mid} ({self.fetched_at})"
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.utils import timezone
+
+from investments.market_hours import MARKET_TIMEZONE, MARKET_CLOSE
+
+import datetime
+import numpy as np
+
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+
+# ----------------------------------------------------------------------- #
+#                             Normal Distribution
+# ----------------------------------------------------------------------- #
+def erf(x):
+    # Abramowitz & Stegun 7.1.26, max error 1.5e-7, keeps us off scipy
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return sign * (1.0 - poly * np.exp(-x * x))
+
+def norm_cdf(x):
+    return 0.5 * (1.0 + erf(x / np.sqrt(2.0)))
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2.0 * np.pi)
+
+# ----------------------------------------------------------------------- #
+#                             Black-Scholes
+# ----------------------------------------------------------------------- #
+def year_fraction(expiration_date: datetime.date, now: datetime.datetime):
+    # Contracts stop trading at the close on their expiration date
+    expires_at = datetime.datetime.combine(expiration_date, MARKET_CLOSE, tzinfo=MARKET_TIMEZONE)
+    return max((expires_at - now).total_seconds(), 0) / SECONDS_PER_YEAR
+
+def years_to_expiry(expiration_dates, now: datetime.datetime = None):
+    now = now or timezone.now()
+    return np.fromiter(
+        (year_fraction(expiration_date, now) for expiration_date in expiration_dates),
+        dtype=np.float64,
+        count=len(expiration_dates),
+    )
+
+def black_scholes(spot, strike, years, vol, is_call, rate: float = None):
+    # Price and greeks per share for every contract at once. theta is per calendar day and vega per
+    #  1 point of volatility, matching the chain endpoint. Expired contracts are worth intrinsic value
+    rate = settings.RISK_FREE_RATE if rate is None else rate
+    spot, strike, years, vol, is_call = np.broadcast_arrays(
+        np.asarray(spot, dtype=np.float64),
+        np.asarray(strike, dtype=np.float64),
+        np.asarray(years, dtype=np.float64),
+        np.asarray(vol, dtype=np.float64),
+        np.asarray(is_call, dtype=bool),
+    )
+
+    live = (years > 0) & (vol > 0) & (spot > 0) & (strike > 0)
+    s = np.where(live, spot, 1.0)
+    k = np.where(live, strike, 1.0)
+    t = np.where(live, years, 1.0)
+    v = np.where(live, vol, 1.0)
+    sqrt_t = np.sqrt(t)
+
+    d1 = (np.log(s / k) + (rate + 0.5 * v * v) * t) / (v * sqrt_t)
+    d2 = d1 - v * sqrt_t
+    discount = np.exp(-rate * t)
+    pdf_d1 = norm_pdf(d1)
+
+    call_price = s * norm_cdf(d1) - k * discount * norm_cdf(d2)
+    put_price = k * discount * norm_cdf(-d2) - s * norm_cdf(-d1)
+    decay = -s * pdf_d1 * v / (2 * sqrt_t)
+    call_theta = (decay - rate * k * discount * norm_cdf(d2)) / 365
+    put_theta = (decay + rate * k * discount * norm_cdf(-d2)) / 365
+
+    # Without a spot (a contract carried at zero) there is nothing to be in the money against
+    has_spot = spot > 0
+    intrinsic = np.where(has_spot, np.where(is_call, np.maximum(spot - strike, 0), np.maximum(strike - spot, 0)), 0.0)
+    expired_delta = np.where(has_spot, np.where(is_call, (spot > strike).astype(np.float64), -(spot < strike).astype(np.float64)), 0.0)
+
+    return {
+        'price': np.where(live, np.where(is_call, call_price, put_price), intrinsic),
+        'delta': np.where(live, np.where(is_call, norm_cdf(d1), norm_cdf(d1) - 1), expired_delta),
+        'gamma': np.where(live, pdf_d1 / (s * v * sqrt_t), 0.0),
+        'theta': np.where(live, np.where(is_call, call_theta, put_theta), 0.0),
+        'vega': np.where(live, s * pdf_d1 * sqrt_t / 100, 0.0),
+    }
+
+def implied_volatility(price, spot, strike, years, is_call, rate: float = None, iterations: int = 60):
+    # Vectorized bisection, price is monotonic in vol so every contract converges together.
+    #  NaN where the price can't be explained (expired, no spot, below intrinsic)
+    price, spot, strike, years, is_call = np.broadcast_arrays(
+        np.asarray(price, dtype=np.float64),
+        np.asarray(spot, dtype=np.float64),
+        np.asarray(strike, dtype=np.float64),
+        np.asarray(years, dtype=np.float64),
+        np.asarray(is_call, dtype=bool),
+    )
+    low = np.full(price.shape, 1e-4)
+    high = np.full(price.shape, 5.0)
+    for _ in range(iterations):
+        vol = (low + high) / 2
+        too_high = black_scholes(spot, strike, years, vol, is_call, rate)['price'] > price
+        high = np.where(too_high, vol, high)
+        low = np.where(too_high, low, vol)
+
+    intrinsic = np.where(is_call, np.maximum(spot - strike, 0), np.maximum(strike - spot, 0))
+    valid = (years > 0) & (spot > 0) & (price > intrinsic)
+    return np.where(valid, (low + high) / 2, np.nan)
+
+def price_options(spot, strike, expiration_dates, is_call, vol=None, now: datetime.datetime = None):
+    # Theoretical value of contracts from their terms, vol defaults to DEFAULT_IMPLIED_VOLATILITY
+    vol = np.where(np.isnan(vol), settings.DEFAULT_IMPLIED_VOLATILITY, vol) if vol is not None else settings.DEFAULT_IMPLIED_VOLATILITY
+    return black_scholes(spot, strike, years_to_expiry(expiration_dates, now), vol, is_call)
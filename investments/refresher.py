@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+from investments.models import QuoteSnapshot
+from investments.snapshot import SNAPSHOT_CACHE_KEY, build_snapshot, is_stale
+from investments.history import prune_points
+from investments import market_hours
+
+import datetime
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_refresher_thread = None
+
+def refresh_once(force: bool = False):
+    # Refresh on every tick while the market is open, otherwise only when the stored snapshot
+    #  predates the last close. Returns the new snapshot, or None if nothing needed refreshing
+    snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+    if not force and snapshot is not None:
+        if not market_hours.is_market_open() and not is_stale(snapshot):
+            logger.debug("Market closed and snapshot is current, skipping refresh")
+            return None
+        # The cache is shared, so another worker's refresher may have just done this tick
+        if timezone.now() - snapshot['generated_at'] < datetime.timedelta(seconds=settings.PRICE_REFRESH_INTERVAL / 2):
+            logger.debug("Snapshot was refreshed by another worker, skipping refresh")
+            return None
+
+    snapshot = build_snapshot()
+    QuoteSnapshot.prune(older_than=timezone.now() - datetime.timedelta(days=settings.QUOTE_SNAPSHOT_RETENTION_DAYS))
+    prune_points()
+    return snapshot
+
+def run_forever(interval: int, stop_event: threading.Event):
+    while not stop_event.is_set():
+        try:
+            refresh_once()
+        except Exception:
+            logger.exception("Price refresh failed")
+        finally:
+            close_old_connections()
+        stop_event.wait(interval)
+
+def start_background_refresher():
+    global _refresher_thread
+    if not settings.PRICE_REFRESHER_ENABLED or _refresher_thread is not None:
+        return None
+
+    _refresher_thread = threading.Thread(
+        target=run_forever,
+        args=(settings.PRICE_REFRESH_INTERVAL, threading.Event()),
+        name="price-refresher",
+        daemon=True,
+    )
+    _refresher_thread.start()
+    logger.info(f"Started background price refresher every {settings.PRICE_REFRESH_INTERVAL}s")
+    return _refresher_thread
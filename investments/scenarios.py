@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from investments.analytics import pack_positions, get_implied_vols
+from investments.pricing import black_scholes
+
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Every underlying moves by the same fraction (0.05 = +5%) and every option's implied vol by the
+#  same absolute amount (0.1 = +10 vol points). Options are revalued with Black-Scholes from the
+#  vol implied by their current mid, so the unshocked cell is always 0
+
+MAX_SHOCKS = 50
+MIN_VOL = 1e-4
+
+# ----------------------------------------------------------------------- #
+#                             Grid
+# ----------------------------------------------------------------------- #
+def get_scenario_grid(snapshot: dict, price_shocks: list[float], vol_shocks: list[float]):
+    # Results only change with the snapshot, so they are cached under its version
+    cache_key = f"scenarios_{snapshot['version']}_{','.join(map(str, price_shocks))}_{','.join(map(str, vol_shocks))}"
+    if (grid := cache.get(cache_key)) is not None:
+        return grid
+
+    packed = pack_positions(snapshot['all_active_options'], snapshot['all_active_shares'], snapshot)
+    grid = {'version': snapshot['version']} | run_scenarios(packed, price_shocks, vol_shocks)
+    cache.set(cache_key, grid, settings.SCENARIO_CACHE_TTL)
+    logger.info(f"Computed {len(price_shocks)}x{len(vol_shocks)} scenario grid for snapshot {snapshot['version']}")
+    return grid
+
+def run_scenarios(packed: dict, price_shocks: list[float], vol_shocks: list[float]):
+    # Positions are revalued for every cell at once, arrays are (price shock, vol shock, position)
+    spot_moves = 1 + np.asarray(price_shocks, dtype=np.float64)[:, None, None]
+    vol_moves = np.asarray(vol_shocks, dtype=np.float64)[None, :, None]
+
+    base_vol = get_implied_vols(packed)
+    base_value = value_positions(packed, packed['underlying_price'], base_vol)
+    shocked_value = value_positions(packed, packed['underlying_price'] * spot_moves, np.maximum(base_vol + vol_moves, MIN_VOL))
+    position_pl = (shocked_value - base_value) * packed['num_open'] * packed['multiplier']
+
+    # One-hot ticker matrix turns the per-position P&L into per-ticker sums with a single matmul
+    tickers, ticker_index = np.unique(packed['tickers'], return_inverse=True)
+    by_ticker = position_pl @ np.eye(len(tickers))[ticker_index]
+
+    return {
+        'price_shocks': list(price_shocks),
+        'vol_shocks': list(vol_shocks),
+        'pl': position_pl.sum(axis=-1).tolist(),
+        'pl_by_ticker': {ticker: by_ticker[..., i].tolist() for i, ticker in enumerate(tickers.tolist())},
+    }
+
+def value_positions(packed: dict, spot, vol):
+    # Value of one share or one contract's underlying share, before num_open and the multiplier
+    option_price = black_scholes(spot, packed['strike_price'], packed['years'], vol, packed['is_call'])['price']
+    return np.where(packed['is_option'], option_price, spot)
+
+# ----------------------------------------------------------------------- #
+#                             Request Parsing
+# ----------------------------------------------------------------------- #
+def parse_shocks(value: str, default: list[float]):
+    # "-0.1,0,0.1" -> [-0.1, 0.0, 0.1]
+    if not value:
+        return default
+
+    try:
+        shocks = [float(shock) for shock in value.split(',')]
+    except ValueError:
+        raise ValueError(f"Invalid shock list '{value}', expected comma separated numbers")
+    if len(shocks) > MAX_SHOCKS:
+        raise ValueError(f"At most {MAX_SHOCKS} shocks per axis")
+    if not all(np.isfinite(shocks)):
+        raise ValueError(f"Invalid shock list '{value}', expected finite numbers")
+
+    return shocks
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.05  # seconds between cache checks while another caller is fetching
+
+
+def coalesce(key: str, read, fetch, read_stale=None):
+    # Returns read() if it has a value, otherwise makes sure only one caller per key runs fetch().
+    #  The in-flight marker is set with the shared cache's atomic add(), so this holds across threads
+    #  and worker processes. Waiters re-read the cache once the fetch lands, or take read_stale()
+    #  straight away if given, and never block on the fetching thread itself
+    if (value := read()) is not None:
+        return value
+
+    inflight_key = f"{key}_inflight"
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT
+    while True:
+        if cache.add(inflight_key, os.getpid(), timeout=settings.SINGLE_FLIGHT_LOCK_TTL):
+            try:
+                # Someone may have finished fetching between our read and taking the marker
+                if (value := read()) is not None:
+                    return value
+                return fetch()
+            finally:
+                cache.delete(inflight_key)
+
+        if read_stale is not None and (value := read_stale()) is not None:
+            logger.info(f"Fetch for {key} in flight elsewhere, serving stale value")
+            return value
+
+        time.sleep(POLL_INTERVAL)
+        if (value := read()) is not None:
+            return value
+
+        if time.monotonic() >= deadline:
+            logger.warning(f"Gave up waiting on in-flight fetch for {key}, fetching directly")
+            return fetch()
+
+async def acoalesce(key: str, read, fetch, read_stale=None):
+    # coalesce() for coroutines, read/fetch/read_stale are async callables. Shares the in-flight marker
+    #  with the sync version, so async and sync callers coalesce with each other
+    if (value := await read()) is not None:
+        return value
+
+    inflight_key = f"{key}_inflight"
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT
+    while True:
+        if await cache.aadd(inflight_key, os.getpid(), timeout=settings.SINGLE_FLIGHT_LOCK_TTL):
+            try:
+                if (value := await read()) is not None:
+                    return value
+                return await fetch()
+            finally:
+                await cache.adelete(inflight_key)
+
+        if read_stale is not None and (value := await read_stale()) is not None:
+            logger.info(f"Fetch for {key} in flight elsewhere, serving stale value")
+            return value
+
+        await asyncio.sleep(POLL_INTERVAL)
+        if (value := await read()) is not None:
+            return value
+
+        if time.monotonic() >= deadline:
+            logger.warning(f"Gave up waiting on in-flight fetch for {key}, fetching directly")
+            return await fetch()
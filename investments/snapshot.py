@@ -0,0 +1,174 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from investments.helpers import load_positions, get_live_prices, evaluate_prices, update_prices, calculate_stats, aload_positions, aget_live_prices
+from investments import market_hours
+
+import datetime
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_KEY = "portfolio_snapshot"
+# Just the version, so watchers can check for a new snapshot without unpickling the whole thing
+SNAPSHOT_VERSION_CACHE_KEY = "portfolio_snapshot_version"
+# Rendered dashboards are stored per snapshot version. Every rebuild replaces the version and every
+#  write (create_transaction, imports, ledger repairs) drops it, so a page can't outlive its data
+RENDERED_PAGE_CACHE_KEY = "portfolio_page_{version}"
+
+# ----------------------------------------------------------------------- #
+#                             Build
+# ----------------------------------------------------------------------- #
+def build_snapshot():
+    # Fetches quotes, writes current values and computes the stats the dashboard renders
+    positions = load_positions()
+    live_prices = get_live_prices(positions)  # live_option_prices, live_stock_prices
+    portfolio = evaluate_prices(live_prices, positions)
+    update_prices(portfolio, positions)
+    stats = calculate_stats(portfolio, positions)
+    logger.debug(f"STATS: {stats['stats']}")
+    return store_snapshot(positions, live_prices, stats)
+
+async def abuild_snapshot():
+    # build_snapshot() for async views: positions load on the async ORM and quotes are gathered on the
+    #  event loop. The bulk updates and stats are plain blocking ORM work and run in a thread
+    positions = await aload_positions()
+    live_prices = await aget_live_prices(positions)
+    portfolio = evaluate_prices(live_prices, positions)
+    await sync_to_async(update_prices)(portfolio, positions)
+    stats = await sync_to_async(calculate_stats)(portfolio, positions)
+    logger.debug(f"STATS: {stats['stats']}")
+    return await sync_to_async(store_snapshot)(positions, live_prices, stats)
+
+def store_snapshot(positions: dict, live_prices: dict, stats: dict):
+    snapshot = {
+        'version': uuid.uuid4().hex,
+        'generated_at': timezone.now(),
+        'all_active_options': positions['all_active_options'],
+        'all_active_shares': positions['all_active_shares'],
+    }
+    snapshot |= live_prices
+    snapshot |= stats
+
+    cache.set(SNAPSHOT_CACHE_KEY, snapshot, timeout=None)
+    cache.set(SNAPSHOT_VERSION_CACHE_KEY, snapshot['version'], timeout=None)
+    logger.info(f"Stored portfolio snapshot {snapshot['version']}")
+    return snapshot
+
+# ----------------------------------------------------------------------- #
+#                             Read
+# ----------------------------------------------------------------------- #
+def get_latest_snapshot():
+    snapshot = cache.get(SNAPSHOT_CACHE_KEY)
+    if snapshot is None or is_stale(snapshot):
+        logger.info("No fresh portfolio snapshot, building one inline")
+        return build_snapshot()
+
+    return snapshot
+
+async def aget_latest_snapshot():
+    snapshot = await cache.aget(SNAPSHOT_CACHE_KEY)
+    if snapshot is None or is_stale(snapshot):
+        logger.info("No fresh portfolio snapshot, building one inline")
+        return await abuild_snapshot()
+
+    return snapshot
+
+def is_stale(snapshot: dict, now: datetime.datetime = None):
+    # While the market is open a snapshot ages out after SNAPSHOT_MAX_AGE seconds,
+    #  outside of market hours it stays good as long as it was taken after the last close.
+    #  Snapshots with quotes that missed the deadline or failed are rebuilt once they're older than
+    #  QUOTE_TTL_MARKET_OPEN, the same retry window fallback quotes are cached for. Right away would
+    #  rebuild on every request for a ticker that can't be quoted at all
+    now = now or timezone.now()
+    age = now - snapshot['generated_at']
+    if (snapshot['stale_option_ids'] or snapshot['stale_share_ids']) and age > datetime.timedelta(seconds=settings.QUOTE_TTL_MARKET_OPEN):
+        return True
+    if market_hours.is_market_open(now):
+        return age > datetime.timedelta(seconds=settings.SNAPSHOT_MAX_AGE)
+
+    return snapshot['generated_at'] < market_hours.previous_close(now)
+
+def invalidate_snapshot():
+    cache.delete_many([SNAPSHOT_CACHE_KEY, SNAPSHOT_VERSION_CACHE_KEY])
+
+# ----------------------------------------------------------------------- #
+#                             Rendered
+# ----------------------------------------------------------------------- #
+async def aget_rendered_page():
+    # Only the small version key and the page itself are read, the snapshot is never unpickled
+    if (version := await cache.aget(SNAPSHOT_VERSION_CACHE_KEY)) is None:
+        return None
+    page = await cache.aget(RENDERED_PAGE_CACHE_KEY.format(version=version))
+    if page is None or is_stale(page):
+        return None
+
+    return page['content']
+
+async def astore_rendered_page(snapshot: dict, content: str):
+    # Kept with what is_stale() needs, so a page ages out exactly like the snapshot it came from
+    page = {
+        'generated_at': snapshot['generated_at'],
+        'stale_option_ids': snapshot['stale_option_ids'],
+        'stale_share_ids': snapshot['stale_share_ids'],
+        'content': content,
+    }
+    if is_stale(page):
+        return
+    await cache.aset(RENDERED_PAGE_CACHE_KEY.format(version=snapshot['version']), page, timeout=settings.RENDERED_DASHBOARD_TTL)
+
+# ----------------------------------------------------------------------- #
+#                             Serialize
+# ----------------------------------------------------------------------- #
+def get_stats_payload(snapshot: dict):
+    return {
+        'version': snapshot['version'],
+        'generated_at': snapshot['generated_at'].isoformat(),
+        'stats': snapshot['stats'],
+        'gains_by_ticker': snapshot['gains_by_ticker'],
+        'share_live_gl': snapshot['share_live_gl'],
+        'option_live_gl': snapshot['option_live_gl'],
+    }
+
+def get_positions_payload(snapshot: dict):
+    options = [
+        {
+            'id': option.id,
+            'ticker': option.ticker.nasdaq_name,
+            'expiration_date': option.expiration_date.isoformat(),
+            'strike_price': option.strike_price,
+            'direction': option.direction,
+            'num_open': option.num_open,
+            'cost_basis': option.cost_basis,
+            'current_value': option.current_value,
+            'live_gl': snapshot['option_live_gl'].get(option.id),
+            'underlying_price': snapshot['live_option_prices'][option.id][0],
+            'mid': snapshot['live_option_prices'][option.id][1],
+            'theta': snapshot['live_option_prices'][option.id][2],
+            'stale': option.id in snapshot['stale_option_ids'],
+            'model_price': option.id in snapshot['model_option_ids'],
+        }
+        for option in snapshot['all_active_options']
+    ]
+    shares = [
+        {
+            'id': share.id,
+            'ticker': share.ticker.nasdaq_name,
+            'num_open': share.num_open,
+            'cost_basis': share.cost_basis,
+            'current_value': share.current_value,
+            'live_gl': snapshot['share_live_gl'].get(share.id),
+            'price': snapshot['live_share_prices'][share.id],
+            'stale': share.id in snapshot['stale_share_ids'],
+        }
+        for share in snapshot['all_active_shares']
+    ]
+    return {
+        'version': snapshot['version'],
+        'generated_at': snapshot['generated_at'].isoformat(),
+        'options': options,
+        'shares': shares,
+    }
@@ -0,0 +1,154 @@
+"SQLite-backed cache shared by every worker process on the host."
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    # Every gunicorn worker opens the same database file, so one quote fetch serves all of
+    #  them and entries survive worker restarts. WAL mode lets readers run alongside a writer.
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._location = str(location)
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------- #
+    #                             Connection
+    # ------------------------------------------------------------------- #
+    def _connection(self):
+        # One connection per thread, reopened after a fork so workers never share a handle
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self._location, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entry ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires REAL"
+            ")"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires)")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    # ------------------------------------------------------------------- #
+    #                             Cache API
+    # ------------------------------------------------------------------- #
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Atomic across processes: only replaces a row that has already expired
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        conn = self._connection()
+        cursor = conn.execute(
+            "INSERT INTO cache_entry (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+            "WHERE cache_entry.expires IS NOT NULL AND cache_entry.expires <= ?",
+            (key, pickled, self.get_backend_timeout(timeout), time.time()),
+        )
+        added = cursor.rowcount > 0
+        if added:
+            self._maybe_cull(conn)
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            "SELECT value, expires FROM cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or self._has_expired(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)",
+            (key, pickled, self.get_backend_timeout(timeout)),
+        )
+        self._maybe_cull(conn)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            "UPDATE cache_entry SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value, expires FROM cache_entry WHERE key = ?", (key,)).fetchone()
+            if row is None or self._has_expired(row[1]):
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(row[0]) + delta
+            conn.execute(
+                "UPDATE cache_entry SET value = ? WHERE key = ?",
+                (pickle.dumps(new_value, self.pickle_protocol), key),
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return new_value
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute("SELECT expires FROM cache_entry WHERE key = ?", (key,)).fetchone()
+        return row is not None and not self._has_expired(row[0])
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entry")
+
+    def close(self, **kwargs):
+        # Connections are per thread and reused across requests, nothing to do per request
+        pass
+
+    # ------------------------------------------------------------------- #
+    #                             Eviction
+    # ------------------------------------------------------------------- #
+    def _has_expired(self, expires):
+        return expires is not None and expires <= time.time()
+
+    def _maybe_cull(self, conn):
+        # Expired rows go first. If the cache is still over MAX_ENTRIES, drop 1/CULL_FREQUENCY
+        #  of the entries closest to expiring (CULL_FREQUENCY 0 empties the cache)
+        count = conn.execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+        if count <= self._max_entries:
+            return
+
+        conn.execute("DELETE FROM cache_entry WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+        count = conn.execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+        if count <= self._max_entries:
+            return
+
+        if self._cull_frequency == 0:
+            conn.execute("DELETE FROM cache_entry")
+            return
+
+        conn.execute(
+            "DELETE FROM cache_entry WHERE key IN ("
+            " SELECT key FROM cache_entry ORDER BY expires IS NULL, expires LIMIT ?"
+            ")",
+            (count // self._cull_frequency,),
+        )
@@ -1,3 +1,99 @@
-from django.test import TestCase
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from investments.models import Cash, Option, Share, Ticker, Transaction
+from investments.helpers import load_positions
+
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import json
 
 # Create your tests here.
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConcurrentTradeTests(TransactionTestCase):
+    THREADS = 8
+    TRADES_PER_THREAD = 10
+
+    def setUp(self):
+        self.main_cash = Cash.objects.create(num_open=100000, description='m')
+        ticker = Ticker.objects.create(nasdaq_name='GME', type='sto')
+        self.share = Share.objects.create(ticker=ticker, num_open=100, cost_basis=20, live_pl=-2000)
+
+    def submit_trades(self, count):
+        client = Client()
+        try:
+            return [
+                client.post(
+                    '/investments/api/create-transaction/',
+                    json.dumps({
+                        'security_type': 'share',
+                        'existing_or_new': 'existing',
+                        'existing_security_id': self.share.id,
+                        'quantity': 1,
+                        'price': 10,
+                        'date': '2024-09-20',
+                    }),
+                    content_type='application/json',
+                ).status_code
+                for _ in range(count)
+            ]
+        finally:
+            connection.close()
+
+    def test_parallel_trades_keep_cash_and_positions_consistent(self):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            statuses = [
+                status
+                for statuses in executor.map(self.submit_trades, [self.TRADES_PER_THREAD] * self.THREADS)
+                for status in statuses
+            ]
+
+        trades = self.THREADS * self.TRADES_PER_THREAD
+        self.assertEqual(statuses, [200] * trades)
+        self.assertEqual(Transaction.objects.count(), trades)
+        self.main_cash.refresh_from_db()
+        self.assertAlmostEqual(self.main_cash.num_open, 100000 - 10 * trades)
+        self.share.refresh_from_db()
+        self.assertEqual(self.share.num_open, 100 + trades)
+
+
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        Cash.objects.create(num_open=100000, description='m')
+        ticker = Ticker.objects.create(nasdaq_name='GME', type='sto')
+        Share.objects.create(ticker=ticker, num_open=100, cost_basis=20, live_pl=-2000)
+        Option.objects.create(ticker=ticker, num_open=-1, expiration_date=datetime.date(2024, 10, 18), strike_price=25, direction='c', cost_basis=1, live_pl=1)
+
+    def get_plans(self, run):
+        # EXPLAIN QUERY PLAN of every query the callable runs
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        with connection.cursor() as cursor:
+            return {
+                query['sql']: ' | '.join(str(row[-1]) for row in cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}").fetchall())
+                for query in queries
+            }
+
+    def assertUsesIndex(self, plans, table, index):
+        matching = [plan for sql, plan in plans.items() if f'"{table}"' in sql]
+        self.assertTrue(matching, f"No query on {table}")
+        self.assertTrue(any(index in plan for plan in matching), f"{index} not used: {matching}")
+
+    def test_dashboard_position_queries_use_partial_indexes(self):
+        plans = self.get_plans(load_positions)
+        self.assertUsesIndex(plans, 'investments_option', 'option_open_expiry_idx')
+        self.assertUsesIndex(plans, 'investments_share', 'share_open_idx')
+
+    def test_main_cash_lookup_uses_unique_constraint(self):
+        share = Share.objects.get()
+        plans = self.get_plans(lambda: share.update_cash_value(price=10, quantity=1))
+        self.assertUsesIndex(plans, 'investments_cash', 'cash_single_main')
+
+    def test_transaction_lookup_by_security_uses_index(self):
+        share = Share.objects.get()
+        content_type = ContentType.objects.get_for_model(Share)
+        plans = self.get_plans(lambda: list(Transaction.objects.filter(content_type=content_type, object_id=share.id)))
+        self.assertUsesIndex(plans, 'investments_transaction', 'transaction_security_idx')
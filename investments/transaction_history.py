@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from investments.models import Option, Share, Cash, Transaction
+
+import json
+
+# Transactions are paged by (date, id) keyset instead of OFFSET, so every page is an index range
+#  scan no matter how deep it is. A cursor is the last row's "date_id", e.g. "2024-09-20_42"
+
+MAX_PAGE_SIZE = 1000
+SECURITY_TYPES = {'share': Share, 'option': Option, 'cash': Cash}
+
+# ----------------------------------------------------------------------- #
+#                             Query
+# ----------------------------------------------------------------------- #
+def filter_transactions(ticker: str = None, security_type: str = None, start=None, end=None):
+    queryset = Transaction.objects.select_related('content_type').order_by('date', 'id')
+    if security_type:
+        queryset = queryset.filter(content_type=ContentType.objects.get_for_model(SECURITY_TYPES[security_type]))
+    if ticker:
+        # Cash has no ticker, so a ticker filter only matches share and option trades
+        content_types = ContentType.objects.get_for_models(Share, Option)
+        queryset = queryset.filter(
+            Q(content_type=content_types[Share], object_id__in=Share.objects.filter(ticker__nasdaq_name=ticker).values('id'))
+            | Q(content_type=content_types[Option], object_id__in=Option.objects.filter(ticker__nasdaq_name=ticker).values('id'))
+        )
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    return queryset
+
+def get_page(queryset, cursor: tuple, page_size: int):
+    # The securities of a whole page come back in one query per security type
+    if cursor:
+        date, transaction_id = cursor
+        queryset = queryset.filter(Q(date__gt=date) | Q(date=date, id__gt=transaction_id))
+    return list(
+        queryset.prefetch_related(GenericPrefetch('security', [
+            Share.objects.select_related('ticker'),
+            Option.objects.select_related('ticker'),
+            Cash.objects.all(),
+        ]))[:page_size]
+    )
+
+# ----------------------------------------------------------------------- #
+#                             Cursors
+# ----------------------------------------------------------------------- #
+def parse_cursor(value: str):
+    if not value:
+        return None
+    date, _, transaction_id = value.partition('_')
+    if (date := parse_date(date)) is None or not transaction_id.isdigit():
+        raise ValueError(f"Invalid cursor '{value}'")
+    return date, int(transaction_id)
+
+def make_cursor(transaction: Transaction):
+    return f"{transaction.date.isoformat()}_{transaction.id}"
+
+# ----------------------------------------------------------------------- #
+#                             Streaming
+# ----------------------------------------------------------------------- #
+def serialize_transaction(transaction: Transaction):
+    security = transaction.security
+    return {
+        'id': transaction.id,
+        'date': transaction.date.isoformat(),
+        'price': transaction.price,
+        'quantity': transaction.quantity,
+        'value': transaction.value,
+        'security_type': transaction.content_type.model if security is None else type(security).__name__.lower(),
+        'security_id': transaction.object_id,
+        'security': str(security) if security is not None else None,
+        'ticker': security.ticker.nasdaq_name if isinstance(security, (Share, Option)) else None,
+    }
+
+def stream_transactions(queryset, cursor: tuple = None, limit: int = None):
+    # Yields a JSON document one row at a time. With a limit it is one page plus the cursor of the
+    #  next one, without it the whole history is walked page by page so only one page is in memory
+    page_size = min(limit or settings.TRANSACTION_PAGE_SIZE, MAX_PAGE_SIZE)
+    yield '{"transactions": ['
+    separator = ''
+    next_cursor = None
+    while True:
+        page = get_page(queryset, cursor, page_size)
+        for transaction in page:
+            yield separator + json.dumps(serialize_transaction(transaction))
+            separator = ', '
+        if len(page) < page_size:
+            break
+        cursor = (page[-1].date, page[-1].id)
+        if limit:
+            next_cursor = make_cursor(page[-1])
+            break
+
+    yield f'], "next": {json.dumps(next_cursor)}}}'
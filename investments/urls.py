@@ -6,5 +6,12 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("<int:option_id>/", views.detail, name="details"),
     path('api/create-transaction/', views.create_transaction, name='create_transaction'),
+    path('api/import-transactions/', views.import_transactions_csv, name='import_transactions'),
     path('api/get-securities/', views.get_securities, name='get_securities'),
+    path('api/stats/', views.stats, name='stats'),
+    path('api/positions/', views.positions, name='positions'),
+    path('api/live/', views.live, name='live'),
+    path('api/scenarios/', views.scenarios, name='scenarios'),
+    path('api/transactions/', views.transactions, name='transactions'),
+    path('api/portfolio-history/', views.portfolio_history, name='portfolio_history'),
 ]
\ No newline at end of file
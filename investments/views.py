@@ -1,43 +1,94 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.template import loader
 from django.db.models import Sum
 from django.conf import settings
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
 
-from investments.models import Option, Share, Transaction, Ticker, Cash
-from investments.helpers import get_live_prices, update_prices, calculate_stats
+from investments.models import Option, Share, Transaction, Ticker, Cash, PortfolioTracker
+from investments.snapshot import get_latest_snapshot, aget_latest_snapshot, aget_rendered_page, astore_rendered_page, invalidate_snapshot, get_stats_payload, get_positions_payload
+from investments.scenarios import get_scenario_grid, parse_shocks
+from investments.importer import import_transactions
+from investments.error_models import LedgerError
+from investments.history import get_series, lttb
+from investments.live import stream_events
+from investments.transaction_history import SECURITY_TYPES, filter_transactions, parse_cursor, stream_transactions
 
+import datetime
+import io
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
-def index(request):
-    live_prices = get_live_prices()  # live_option_prices, live_stock_prices
-    update_prices(live_prices)
-    stats = calculate_stats(live_prices)
-    logger.debug(f"STATS: {stats['stats']}")
+async def index(request):
+    # Quotes, current values and stats come from the latest snapshot (kept warm by the refresher).
+    #  A cold or stale snapshot is rebuilt without holding a worker thread while quotes are in flight.
+    #  Repeat views of the same snapshot get the rendered page back without touching the template
+    if (content := await aget_rendered_page()) is not None:
+        return HttpResponse(content)
 
-    all_active_options = Option.objects.exclude(num_open=0).order_by('expiration_date')
-    all_active_shares = Share.objects.exclude(num_open=0)
-
-    context = {
-        'all_active_options': all_active_options,
-        'all_active_shares': all_active_shares
-    }
-
-    context |= live_prices
-    context |= stats
+    if is_asgi_request(request):
+        context = await aget_latest_snapshot()
+    else:
+        # Under WSGI this loop only lives for the request, late quote tasks would be cancelled with it.
+        #  The threaded path's pool outlives the request and lets them finish into the cache
+        context = await sync_to_async(get_latest_snapshot)()
 
     logger.debug(f"FINAL CONTEXT :{context}")
     template = loader.get_template("index.html")
-    return HttpResponse(template.render(context, request))
+    content = template.render(context, request)
+    await astore_rendered_page(context, content)
+    return HttpResponse(content)
+
+def is_asgi_request(request):
+    # Only an ASGI server keeps an event loop running between requests
+    return isinstance(request, ASGIRequest)
+
+def get_request_snapshot(request):
+    # Resolved once per request, so the ETag and the body always come from the same snapshot and a
+    #  stale one is rebuilt at most once
+    if not hasattr(request, 'snapshot'):
+        request.snapshot = get_latest_snapshot()
+    return request.snapshot
+
+def get_snapshot_etag(request):
+    # The snapshot version changes with every rebuild, so it is a strong validator for anything served from it
+    return get_request_snapshot(request)['version']
+
+@require_http_methods(["GET"])
+@cache_control(no_cache=True)
+@condition(etag_func=get_snapshot_etag)
+def stats(request):
+    # Pollers send If-None-Match and get an empty 304 until the next snapshot
+    return JsonResponse(get_stats_payload(get_request_snapshot(request)))
+
+@require_http_methods(["GET"])
+@cache_control(no_cache=True)
+@condition(etag_func=get_snapshot_etag)
+def positions(request):
+    return JsonResponse(get_positions_payload(get_request_snapshot(request)))
+
+@require_http_methods(["GET"])
+async def live(request):
+    # Server-sent events stream of snapshot updates, served from the per-process broadcaster.
+    #  The stream never ends, so under WSGI (runserver) it would hold a worker forever without sending
+    #  anything. A 204 there tells EventSource to stop reconnecting
+    if not is_asgi_request(request):
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(stream_events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 def detail(request, option_id):
     response = f"This is the detail page for option {option_id}"
@@ -110,6 +161,7 @@ def create_transaction(request):
                 value=price*quantity
             )
             logger.info("Created New Transaction")
+            transaction.on_commit(invalidate_snapshot)
 
         return JsonResponse({'status': 'success', 'message': 'Transaction created successfully'})
     except ObjectDoesNotExist:
@@ -117,6 +169,20 @@ def create_transaction(request):
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def import_transactions_csv(request):
+    # Broker export uploaded as 'file', see investments/importer.py for the columns
+    if 'file' not in request.FILES:
+        return JsonResponse({'status': 'error', 'message': 'No file uploaded'}, status=400)
+
+    try:
+        summary = import_transactions(io.TextIOWrapper(request.FILES['file'], encoding='utf-8-sig'))
+    except (LedgerError, ObjectDoesNotExist) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse({'status': 'success', 'message': f"Imported {summary['transactions']} transactions"} | summary)
+
 @require_http_methods(["GET"])
 def get_securities(request):
     security_type = request.GET.get('type', 'option')
@@ -135,4 +201,66 @@ def get_securities(request):
         for security in securities
     ]
     
-    return JsonResponse(securities_data, safe=False)
\ No newline at end of file
+    return JsonResponse(securities_data, safe=False)
+
+@require_http_methods(["GET"])
+def scenarios(request):
+    # P&L of the open positions under a grid of underlying and implied vol shocks
+    try:
+        price_shocks = parse_shocks(request.GET.get('price_shocks'), settings.SCENARIO_PRICE_SHOCKS)
+        vol_shocks = parse_shocks(request.GET.get('vol_shocks'), settings.SCENARIO_VOL_SHOCKS)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    return JsonResponse(get_scenario_grid(get_latest_snapshot(), price_shocks, vol_shocks))
+
+@require_http_methods(["GET"])
+def transactions(request):
+    # Transaction history oldest first, one page at a time (pass back 'next' as after=) or the
+    #  whole filtered history with export=1. Filters: ticker, type, start, end (YYYY-MM-DD)
+    params = request.GET
+    try:
+        cursor = parse_cursor(params.get('after'))
+        limit = None if params.get('export') == '1' else int(params.get('limit', settings.TRANSACTION_PAGE_SIZE))
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1")
+        security_type = params.get('type')
+        if security_type and security_type not in SECURITY_TYPES:
+            raise ValueError(f"type must be one of {list(SECURITY_TYPES)}")
+        start, end = (parse_date(params[key]) if params.get(key) else None for key in ('start', 'end'))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    queryset = filter_transactions(params.get('ticker'), security_type, start, end)
+    return StreamingHttpResponse(stream_transactions(queryset, cursor, limit), content_type='application/json')
+
+@require_http_methods(["GET"])
+def portfolio_history(request):
+    # Portfolio value between from and to (YYYY-MM-DD, defaults to the whole history), downsampled to
+    #  at most points values. resolution picks intraday/d/w/m instead of choosing by range
+    params = request.GET
+    try:
+        end = parse_date(params['to']) if params.get('to') else timezone.localdate()
+        start = parse_date(params['from']) if params.get('from') else (PortfolioTracker.get_oldest_value()[1] or end)
+        points = int(params.get('points', settings.PORTFOLIO_HISTORY_POINTS))
+        resolution = params.get('resolution')
+        if start is None or end is None or start > end:
+            raise ValueError("from and to must be dates (YYYY-MM-DD) with from <= to")
+        if not 3 <= points <= 5000:
+            raise ValueError("points must be between 3 and 5000")
+        if resolution not in (None, 'intraday', 'd', 'w', 'm'):
+            raise ValueError("resolution must be one of intraday, d, w, m")
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    resolution, series = get_series(start, end, resolution)
+    return JsonResponse({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'resolution': resolution,
+        'total_points': len(series),
+        'points': [
+            {'t': datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc).isoformat(), 'value': value}
+            for timestamp, value in lttb(series, points)
+        ],
+    })
@@ -22,6 +22,65 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Load Environment Vars
 load_dotenv()
 MARKET_DATA_API = str(os.getenv('MARKET_DATA_API'))
+# Max number of quote requests in flight at once per worker
+MARKET_DATA_MAX_WORKERS = int(os.getenv('MARKET_DATA_MAX_WORKERS', 8))
+
+# Keep-alive connections to marketdata.app per worker, at least MARKET_DATA_MAX_WORKERS to avoid reconnects
+MARKET_DATA_POOL_SIZE = int(os.getenv('MARKET_DATA_POOL_SIZE', MARKET_DATA_MAX_WORKERS))
+# Per-request timeouts, and how long a dashboard load waits for quotes before falling back to last known prices
+MARKET_DATA_CONNECT_TIMEOUT = float(os.getenv('MARKET_DATA_CONNECT_TIMEOUT', 3.05))  # seconds
+MARKET_DATA_READ_TIMEOUT = float(os.getenv('MARKET_DATA_READ_TIMEOUT', 10))  # seconds
+LIVE_PRICES_DEADLINE = float(os.getenv('LIVE_PRICES_DEADLINE', 2))  # seconds
+# Retries for 429/5xx/connection errors, with jittered exponential backoff
+MARKET_DATA_MAX_RETRIES = int(os.getenv('MARKET_DATA_MAX_RETRIES', 2))
+MARKET_DATA_BACKOFF_BASE = float(os.getenv('MARKET_DATA_BACKOFF_BASE', 0.25))  # seconds
+MARKET_DATA_BACKOFF_CAP = float(os.getenv('MARKET_DATA_BACKOFF_CAP', 4))  # seconds
+# After this many consecutive failed requests an endpoint is skipped for CIRCUIT_BREAKER_COOLDOWN seconds
+CIRCUIT_BREAKER_THRESHOLD = int(os.getenv('CIRCUIT_BREAKER_THRESHOLD', 5))
+CIRCUIT_BREAKER_COOLDOWN = int(os.getenv('CIRCUIT_BREAKER_COOLDOWN', 60))
+
+# Quote cache lifetime while the market is open, closing quotes are held until the next open
+QUOTE_TTL_MARKET_OPEN = int(os.getenv('QUOTE_TTL_MARKET_OPEN', 120))  # seconds
+
+# Local Black-Scholes pricing, used when a quote is missing and for portfolio delta/vega
+RISK_FREE_RATE = float(os.getenv('RISK_FREE_RATE', 0.04))
+DEFAULT_IMPLIED_VOLATILITY = float(os.getenv('DEFAULT_IMPLIED_VOLATILITY', 0.5))
+
+# Default stress grid for /api/scenarios/: underlying moves as fractions, vol moves in absolute points
+SCENARIO_PRICE_SHOCKS = [float(shock) for shock in os.getenv('SCENARIO_PRICE_SHOCKS', '-0.2,-0.1,-0.05,0,0.05,0.1,0.2').split(',')]
+SCENARIO_VOL_SHOCKS = [float(shock) for shock in os.getenv('SCENARIO_VOL_SHOCKS', '-0.1,0,0.1').split(',')]
+SCENARIO_CACHE_TTL = int(os.getenv('SCENARIO_CACHE_TTL', 60 * 60 * 24))  # seconds
+
+# Rows per page of /api/transactions/, and per query when exporting the full history
+TRANSACTION_PAGE_SIZE = int(os.getenv('TRANSACTION_PAGE_SIZE', 100))
+
+# Intraday portfolio values are kept this long (daily/weekly/monthly rollups are kept forever),
+#  and /api/portfolio-history/ serves them for ranges up to PORTFOLIO_HISTORY_INTRADAY_DAYS
+PORTFOLIO_HISTORY_RETENTION_DAYS = int(os.getenv('PORTFOLIO_HISTORY_RETENTION_DAYS', 90))
+PORTFOLIO_HISTORY_INTRADAY_DAYS = int(os.getenv('PORTFOLIO_HISTORY_INTRADAY_DAYS', 7))
+PORTFOLIO_HISTORY_POINTS = int(os.getenv('PORTFOLIO_HISTORY_POINTS', 300))
+
+# Live dashboard stream: how often each process checks for a new snapshot, and how long an idle
+#  stream waits before sending a keepalive
+LIVE_POLL_INTERVAL = float(os.getenv('LIVE_POLL_INTERVAL', 2))  # seconds
+LIVE_KEEPALIVE_INTERVAL = float(os.getenv('LIVE_KEEPALIVE_INTERVAL', 15))  # seconds
+
+# Every fetched quote is kept as a warm-start and last-known-good fallback for this long
+QUOTE_SNAPSHOT_RETENTION_DAYS = int(os.getenv('QUOTE_SNAPSHOT_RETENTION_DAYS', 30))
+
+# Only one fetch per quote is in flight at a time, other callers wait up to SINGLE_FLIGHT_WAIT seconds for it
+SINGLE_FLIGHT_WAIT = float(os.getenv('SINGLE_FLIGHT_WAIT', 10))
+SINGLE_FLIGHT_LOCK_TTL = int(os.getenv('SINGLE_FLIGHT_LOCK_TTL', 30))  # frees the key if a fetching worker dies
+# Expired quotes are kept this long to serve while a refresh is in flight
+STALE_QUOTE_TTL = int(os.getenv('STALE_QUOTE_TTL', 60 * 60 * 24 * 3))
+
+# Background price refresher, keeps a portfolio snapshot warm so the dashboard never waits on the API
+PRICE_REFRESHER_ENABLED = os.getenv('PRICE_REFRESHER_ENABLED', 'False') == 'True'
+PRICE_REFRESH_INTERVAL = int(os.getenv('PRICE_REFRESH_INTERVAL', 60))  # seconds
+# During market hours, snapshots older than this are rebuilt on request
+SNAPSHOT_MAX_AGE = int(os.getenv('SNAPSHOT_MAX_AGE', 180))  # seconds
+# Rendered dashboards are keyed by snapshot version, this only bounds how long superseded ones linger
+RENDERED_DASHBOARD_TTL = int(os.getenv('RENDERED_DASHBOARD_TTL', 3600))  # seconds
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -79,10 +138,14 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "thetagang.wsgi.application"
 
+# Shared by all gunicorn workers on the host (and kept across restarts), so a quote is fetched once
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'investments.sqlite_cache.SQLiteCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 5000)),
+        },
     }
 }
 
@@ -93,6 +156,14 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Take the write lock when a transaction starts instead of failing to upgrade a read lock
+            #  halfway through, and wait for it rather than raising "database is locked"
+            "transaction_mode": "IMMEDIATE",
+            "timeout": int(os.getenv('SQLITE_TIMEOUT', 20)),  # seconds
+        },
+        # On disk so tests can open connections from several threads
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
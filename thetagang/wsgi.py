@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "thetagang.settings")
 
 application = get_wsgi_application()
+
+from investments.refresher import start_background_refresher  # noqa: E402, needs the app registry loaded
+
+start_background_refresher()